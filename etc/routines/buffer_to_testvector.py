@@ -0,0 +1,16 @@
+# buffer_to_testvector.py
+# Convert MP7 buffer files or mp7butler captures back to test vector format.
+from tdf.mp7.buffgen import Buffgen
+from tdf.extern import argparse
+import sys
+
+parser = argparse.ArgumentParser(description="Convert MP7 buffer file or capture to test vector")
+parser.add_argument('filename', help="MP7 buffer file (text, capture or binary)")
+parser.add_argument('--offset', metavar='<n>', type=int, default=0, help="number of leading frames to skip, default is 0")
+parser.add_argument('--size', metavar='<bx>', type=int, default=TDF.ORBIT_LENGTH, help="number of BX to convert")
+parser.add_argument('-o', '--outfile', metavar='<file>', default=sys.stdout, type=argparse.FileType('w'), help="write test vector to file, default is stdout")
+args = parser.parse_args(TDF_ARGS)
+
+TDF_INFO("reading", args.filename)
+count = Buffgen().toTestVector(args.filename, args.outfile, args.offset, args.size)
+TDF_INFO("converted", count, "BX")
@@ -5,11 +5,13 @@ from tdf.extern import argparse
 from tdf.core.toolbox import slot_number, device_type
 from tdf.core import tty
 
-from distutils.version import StrictVersion
-import random
+import threading
 import sys, os
 import uhal
 
+# IPbus timeout (ms) for probing boards, absent slots fail fast.
+PROBE_TIMEOUT = 1000
+
 # -----------------------------------------------------------------------------
 #  Helper functions
 # -----------------------------------------------------------------------------
@@ -21,26 +23,6 @@ def all_equal(items):
     """
     return len(set(items)) == 1
 
-def is_device_present(device):
-    """Retruns True if device is accessible (assumingly present)."""
-    try:
-        read(device, 'ctrl.id')
-    except uhal._core.exception:
-        return False
-    return True
-
-def mp7_version(device):
-    """Retruns MP7 firmware version."""
-    a = read(device, 'ctrl.id.fwrev.a')
-    b = read(device, 'ctrl.id.fwrev.b')
-    c = read(device, 'ctrl.id.fwrev.c')
-    return "{0}.{1}.{2}".format(a, b, c)
-
-def mp7_design(device):
-    """Retruns MP7 firmware design version."""
-    design = read(device, 'ctrl.id.fwrev.design')
-    return design
-
 # -----------------------------------------------------------------------------
 #  TTY colors and helpers
 # -----------------------------------------------------------------------------
@@ -79,21 +61,25 @@ class FancyHeader(object):
 
 class DeviceProperty(object):
 
-    def __init__(self, name, label=None, callback=None, template=None):
+    def __init__(self, name, label=None, items=(), callback=None, template=None, translate=False):
         self.name = name
         self.label = label or name
+        self.items = tuple(items)
         self.callback = callback
         self.template = template or "{}"
+        self.translate = translate
         # Retrieved information
         self.value = None
         self.is_warning = False
         self.is_error = False
         self.message = ""
 
-    def dispatch(self):
-        """Dispatch property value by executing assigned callback function."""
+    def dispatch(self, values):
+        """Assign property value from dictionary of read *values* by item,
+        applying optional callback function to the item values."""
         try:
-            self.value = self.callback() if self.callback else None
+            values = [values[item] for item in self.items]
+            self.value = self.callback(*values) if self.callback else values[0]
         except:
             self.value = None
             self.is_error = True
@@ -119,8 +105,14 @@ class DeviceProperty(object):
 
 class Device(object):
 
-    def __init__(self, device):
+    # Item read to detect if device is present.
+    presence_item = 'ctrl.id'
+
+    def __init__(self, device, timeout=None):
         self.device = device
+        self.timeout = timeout
+        self.hw = None
+        self.error = None
         self.is_present = False
         self.properties = {}
         self.properties_order = []
@@ -138,14 +130,65 @@ class Device(object):
         properties_order = self.properties_order + unordered
         return sorted(self.properties.values(), key=lambda prop: properties_order.index(prop.name))
 
-    def add_property(self, name, label=None, callback=None, template=None):
-        prop = DeviceProperty(name, label, callback, template)
+    def add_property(self, name, label=None, item=None, callback=None, template=None, translate=False, items=()):
+        prop = DeviceProperty(name, label, (item, ) if item else items, callback, template, translate)
         self.properties[name] = prop
         setattr(self, name, prop)
 
+    def read_properties(self, properties):
+        """Read items of all *properties* in a single dispatch."""
+        items = set([self.presence_item])
+        translated = set()
+        for prop in properties:
+            items.update(prop.items)
+            if prop.translate:
+                translated.update(prop.items)
+        return multiread(self.device, sorted(items), translate=translated, timeout=self.timeout, hw=self.hw)
+
     def dispatch(self):
-        for prop in self.properties.values():
-            prop.dispatch()
+        """Read all properties in a single dispatch, absent devices fail on
+        timeout. If the batched read fails on a present device, properties
+        are read one by one."""
+        properties = self.properties.values()
+        try:
+            values = self.read_properties(properties)
+        except Exception:
+            try:
+                multiread(self.device, [self.presence_item], timeout=self.timeout, hw=self.hw)
+            except uhal._core.exception:
+                self.is_present = False
+                return
+            values = {}
+            for prop in properties:
+                try:
+                    values.update(self.read_properties([prop]))
+                except Exception:
+                    pass
+        self.is_present = True
+        for prop in properties:
+            prop.dispatch(values)
+
+    def connect(self):
+        """Resolve hardware interface, to be called from the main thread."""
+        try:
+            self.hw = interface(self.device)
+        except Exception, e:
+            self.fail(e)
+
+    def run(self):
+        """Thread target, dispatches the device recording any error."""
+        if self.error:
+            return
+        try:
+            self.dispatch()
+        except Exception, e:
+            self.fail(e)
+
+    def fail(self, e):
+        """Record error *e*, the device is reported as failed (not absent)."""
+        self.is_present = False
+        self.is_error = True
+        self.error = format(e) or type(e).__name__
 
     def render(self):
         """Render device header and properties."""
@@ -157,108 +200,100 @@ class Device(object):
         if self.is_error:
             style = RedStyle
         lines.append(FancyHeader(get_style(self)).render(self.device, slot))
+        if self.error:
+            lines.append("{}{:>24} : *** {:<49}{}".format(tty.Red+tty.Bold, "error", self.error, tty.Reset))
+            return os.linesep.join(lines)
         for prop in self.ordered_properties:
             lines.append(format(prop.render()))
         return os.linesep.join(lines)
 
 class MP7Device(Device):
 
-    def __init__(self, device):
-        super(MP7Device, self).__init__(device)
-        self.add_property('mp7_firmware', "MP7 firmware", self._mp7_version)
-        self.add_property('mp7_design', "MP7 design", self._mp7_design)
+    def __init__(self, device, timeout=None):
+        super(MP7Device, self).__init__(device, timeout)
+        self.add_property(
+            name='mp7_firmware',
+            label="MP7 firmware",
+            items=('ctrl.id.fwrev.a', 'ctrl.id.fwrev.b', 'ctrl.id.fwrev.c'),
+            callback=lambda a, b, c: "{0}.{1}.{2}".format(a, b, c)
+        )
+        self.add_property('mp7_design', "MP7 design", 'ctrl.id.fwrev.design')
         self.properties_order = [
             'mp7_firmware',
             'mp7_design',
         ]
 
-    def _mp7_present(self):
-        """Retruns True if device is accessible (assumingly present)."""
-        try:
-            read(self.device, 'ctrl.id')
-        except uhal._core.exception:
-            return False
-        return True
-
-    def _mp7_version(self):
-        """Retruns MP7 firmware version."""
-        a = read(self.device, 'ctrl.id.fwrev.a')
-        b = read(self.device, 'ctrl.id.fwrev.b')
-        c = read(self.device, 'ctrl.id.fwrev.c')
-        return "{0}.{1}.{2}".format(a, b, c)
-
-    def _mp7_design(self):
-        """Retruns MP7 firmware design version."""
-        design = read(self.device, 'ctrl.id.fwrev.design')
-        return design
-
-    def dispatch(self):
-        """Detect if board is present, if so dispatch all properties."""
-        self.is_present = self._mp7_present()
-        if self.is_present:
-            super(MP7Device, self).dispatch()
-
 class GtDevice(MP7Device):
 
-    def __init__(self, device):
-        super(GtDevice, self).__init__(device)
+    def __init__(self, device, timeout=None):
+        super(GtDevice, self).__init__(device, timeout)
         self.add_property(
             name='menu_name',
             label="menu name",
-            callback=lambda: read(self.device, 'gt_mp7_gtlfdl.read_versions.l1tm_name', translate=True)
+            item='gt_mp7_gtlfdl.read_versions.l1tm_name',
+            translate=True
         )
         self.add_property(
             name='menu_uuid',
             label="menu UUID",
-            callback=lambda: read(self.device, 'gt_mp7_gtlfdl.read_versions.l1tm_uuid', translate=True)
+            item='gt_mp7_gtlfdl.read_versions.l1tm_uuid',
+            translate=True
         )
         self.add_property(
             name='menu_uuid_fw',
             label="menu firmware UUID",
-            callback=lambda: read(self.device, 'gt_mp7_gtlfdl.read_versions.l1tm_fw_uuid', translate=True)
+            item='gt_mp7_gtlfdl.read_versions.l1tm_fw_uuid',
+            translate=True
         )
         self.add_property(
             name='module_id',
             label="module ID",
-            callback=lambda: read(self.device, 'gt_mp7_gtlfdl.read_versions.module_id')
+            item='gt_mp7_gtlfdl.read_versions.module_id'
         )
         self.add_property(
             name='producer_version',
             label="VHDL producer",
-            callback=lambda: read(self.device, 'gt_mp7_gtlfdl.read_versions.l1tm_compiler_version', translate=True)
+            item='gt_mp7_gtlfdl.read_versions.l1tm_compiler_version',
+            translate=True
         )
         self.add_property(
             name='timestamp',
-            callback=lambda: read(self.device, 'gt_mp7_frame.module_info.timestamp', translate=True)
+            item='gt_mp7_frame.module_info.timestamp',
+            translate=True
         )
         self.add_property(
             name='hostname',
-            callback=lambda: read(self.device, 'gt_mp7_frame.module_info.hostname', translate=True)
+            item='gt_mp7_frame.module_info.hostname',
+            translate=True
         )
         self.add_property(
             name='username',
-            callback=lambda: read(self.device, 'gt_mp7_frame.module_info.username', translate=True)
+            item='gt_mp7_frame.module_info.username',
+            translate=True
         )
         self.add_property(
             name='build_version',
             label="uGT build",
             template="0x{:04x}",
-            callback=lambda: read(self.device, 'gt_mp7_frame.module_info.build_version')
+            item='gt_mp7_frame.module_info.build_version'
         )
         self.add_property(
             name='payload_version',
             label="payload (frame) version",
-            callback=lambda: read(self.device, 'gt_mp7_frame.module_info.frame_version', translate=True)
+            item='gt_mp7_frame.module_info.frame_version',
+            translate=True
         )
         self.add_property(
             name='gtl_version',
             label="GTL version",
-            callback=lambda: read(self.device, 'gt_mp7_gtlfdl.read_versions.gtl_fw_version', translate=True)
+            item='gt_mp7_gtlfdl.read_versions.gtl_fw_version',
+            translate=True
         )
         self.add_property(
             name='fdl_version',
             label="FDL version",
-            callback=lambda: read(self.device, 'gt_mp7_gtlfdl.read_versions.fdl_fw_version', translate=True)
+            item='gt_mp7_gtlfdl.read_versions.fdl_fw_version',
+            translate=True
         )
 
         self.properties_order = [
@@ -304,18 +339,18 @@ class GtDevice(MP7Device):
 
 class AMC502Device(MP7Device):
 
-    def __init__(self, device):
-        super(AMC502Device, self).__init__(device)
+    def __init__(self, device, timeout=None):
+        super(AMC502Device, self).__init__(device, timeout)
         self.add_property(
             name='board_id',
             label="board ID",
-            callback=lambda: read(self.device, 'payload.module_info.board_id')
+            item='payload.module_info.board_id'
         )
         self.add_property(
             name='build_version',
             label="build version",
             template="0x{:04x}",
-            callback=lambda: read(self.device, 'payload.module_info.build_version')
+            item='payload.module_info.build_version'
         )
         self.properties_order = [
             'board_id',
@@ -332,28 +367,30 @@ class AMC502Device(MP7Device):
 
 class FinorDevice(AMC502Device):
 
-    def __init__(self, device):
-        super(FinorDevice, self).__init__(device)
+    def __init__(self, device, timeout=None):
+        super(FinorDevice, self).__init__(device, timeout)
         self.add_property(
             name='timestamp',
             label="timestamp (synthesis)",
-            callback=lambda: read(self.device, 'payload.module_info.timestamp', translate=True)
+            item='payload.module_info.timestamp',
+            translate=True
         )
         self.add_property(
             name='username',
             label="username (crator)",
-            callback=lambda: read(self.device, 'payload.module_info.username', translate=True)
+            item='payload.module_info.username',
+            translate=True
         )
 
 class PreviewDevice(FinorDevice):
 
-    def __init__(self, device):
-        super(PreviewDevice, self).__init__(device)
+    def __init__(self, device, timeout=None):
+        super(PreviewDevice, self).__init__(device, timeout)
 
 class ExtcondDevice(AMC502Device):
 
-    def __init__(self, device):
-        super(ExtcondDevice, self).__init__(device)
+    def __init__(self, device, timeout=None):
+        super(ExtcondDevice, self).__init__(device, timeout)
 
     def match(self, other):
         """Match with reference device."""
@@ -450,6 +487,7 @@ class CrateLayout(object):
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-v', '--verbose', action='store_true', help="show more information")
+parser.add_argument('--timeout', metavar='<ms>', type=int, default=PROBE_TIMEOUT, help="IPbus timeout for detecting absent boards, default {0} ms".format(PROBE_TIMEOUT))
 args = parser.parse_args(TDF_ARGS)
 
 # -----------------------------------------------------------------------------
@@ -457,22 +495,22 @@ args = parser.parse_args(TDF_ARGS)
 # -----------------------------------------------------------------------------
 
 gt_devices = [
-    GtDevice('gt_mp7.1'),
-    GtDevice('gt_mp7.2'),
-    GtDevice('gt_mp7.3'),
-    GtDevice('gt_mp7.4'),
-    GtDevice('gt_mp7.5'),
-    GtDevice('gt_mp7.6'),
+    GtDevice('gt_mp7.1', args.timeout),
+    GtDevice('gt_mp7.2', args.timeout),
+    GtDevice('gt_mp7.3', args.timeout),
+    GtDevice('gt_mp7.4', args.timeout),
+    GtDevice('gt_mp7.5', args.timeout),
+    GtDevice('gt_mp7.6', args.timeout),
 ]
 finor_devices = [
-    PreviewDevice('finor_amc502.7'),
-    PreviewDevice('finor_pre_amc502.8'),
+    PreviewDevice('finor_amc502.7', args.timeout),
+    PreviewDevice('finor_pre_amc502.8', args.timeout),
 ]
 extcond_devices = [
-    ExtcondDevice('extcond_amc502.9'),
-    ExtcondDevice('extcond_amc502.10'),
-    ExtcondDevice('extcond_amc502.11'),
-    ExtcondDevice('extcond_amc502.12'),
+    ExtcondDevice('extcond_amc502.9', args.timeout),
+    ExtcondDevice('extcond_amc502.10', args.timeout),
+    ExtcondDevice('extcond_amc502.11', args.timeout),
+    ExtcondDevice('extcond_amc502.12', args.timeout),
 ]
 
 devices = []
@@ -480,9 +518,14 @@ devices.extend(gt_devices)
 devices.extend(finor_devices)
 devices.extend(extcond_devices)
 
-# Dispatch devices
+# Resolve hardware interfaces up front, dispatch devices concurrently
 for device in devices:
-    device.dispatch()
+    device.connect()
+threads = [threading.Thread(target=device.run) for device in devices]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
 
 # Match MP7 devices
 ref_gt_device = (filter(lambda device: device.is_present, gt_devices) or [None])[0]
@@ -507,6 +550,11 @@ for device in devices:
         if device.is_error:
             crate.set_color(device.slot, RedStyle)
             crate.is_error = True
+    elif device.error:
+        crate.reset(device.slot)
+        crate.set_text(device.slot, 1, "error")
+        crate.set_color(device.slot, RedStyle)
+        crate.is_error = True
     else:
         crate.reset(device.slot)
         crate.set_text(device.slot, 1, " n/a ")
@@ -517,7 +565,7 @@ print crate.render()
 
 # Print device reports
 for device in devices:
-    if device.is_present:
+    if device.is_present or device.error:
         print device.render()
         print
 
@@ -525,7 +573,7 @@ for device in devices:
 warnings = 0
 errors = 0
 for device in devices:
-    if device.is_present:
+    if device.is_present or device.error:
         if device.is_warning:
             warnings += 1
         if device.is_error:
@@ -46,7 +46,7 @@ for channel, count in counts:
     if rate:
         rate_style = tty.Bold
     if args.menu:
-        items = filter(lambda item: item.channel == channel, menu.externals)
+        items = menu.externals.byChannel(channel)
         if items:
             item = items[0]
             name = item.name[:31]
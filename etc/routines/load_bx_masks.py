@@ -4,7 +4,7 @@ from tdf.mp7.images import AlgoBxMemoryImage
 
 parser = argparse.ArgumentParser()
 parser.add_argument('device', help = "device defined in connections file")
-parser.add_argument('filename', help = "filename for a algorithm cancel-out mask (syntax: '<algorithm>: [bx, bx-bx, ...]')")
+parser.add_argument('filename', help = "filename for a algorithm cancel-out mask (syntax: '<algorithm>: [bx, bx-bx, ...]', see tdf.mp7.bxmask)")
 args = parser.parse_args(TDF_ARGS)
 
 # Create new memory image.
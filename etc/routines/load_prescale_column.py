@@ -0,0 +1,23 @@
+# Loads a prescale column from a prescale table.
+from tdf.extern import argparse
+from tdf.mp7.prescales import PreScaleSets
+
+parser = argparse.ArgumentParser()
+parser.add_argument('devices', nargs = '+', help = "devices defined in connections file")
+parser.add_argument('filename', help = "prescale table (syntax: 'algorithm <column> ...' '<algorithm> <factor> ...', see tdf.mp7.prescales)")
+parser.add_argument('column', help = "name of prescale column to load")
+args = parser.parse_args(TDF_ARGS)
+
+# Read prescale table.
+with open(args.filename, 'rb') as fs:
+    sets = PreScaleSets.read(fs)
+
+try:
+    images = sets.images(args.column)
+except KeyError:
+    names = ', '.join(sets.names)
+    raise RuntimeError("no such prescale column `{args.column}' in {args.filename}, available columns: {names}".format(**locals()))
+
+# Read back current factors and upload only differing words to all devices in parallel.
+for device, count in sorted(upload(args.devices, images).items()):
+    TDF_INFO("{device}: {count} dwords written".format(**locals()))
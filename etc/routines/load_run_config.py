@@ -0,0 +1,16 @@
+# Loads prescale factors, FINOR/veto masks and algo BX masks from a run configuration bundle.
+from tdf.extern import argparse
+from tdf.mp7.runconfig import RunConfig
+
+parser = argparse.ArgumentParser()
+parser.add_argument('devices', nargs = '+', help = "devices defined in connections file")
+parser.add_argument('filename', help = "run configuration bundle (YAML, see tdf.mp7.runconfig)")
+parser.add_argument('--verify', action = 'store_true', help = "verify memories after upload")
+args = parser.parse_args(TDF_ARGS)
+
+# Parse bundle and compile memory images once.
+config = RunConfig.read(args.filename)
+
+# Upload only differing words to all devices in parallel.
+for device, count in sorted(upload(args.devices, config.images(), verify = args.verify).items()):
+    TDF_INFO("{device}: {count} dwords written".format(**locals()))
@@ -5,7 +5,9 @@ from tdf.extern import argparse
 from tdf.core import binutils
 from tdf.core import TDF
 from tdf.core.xmlmenu import XmlMenu
-from collections import namedtuple
+from tdf.core.snapshot import LUMI_COUNTERS
+from tdf.core.detectors import MismatchDetector, StuckDetector
+from collections import namedtuple, deque
 import uhal
 import time
 import sys
@@ -39,13 +41,14 @@ def read_orbit_counter(device):
         ], TDF.DATA_WIDTH)
 
 def read_segment_counters(device, ls_number):
-    """Read counters and returns LumiSegment tuple."""
+    """Read counters in a single dispatch and returns LumiSegment tuple."""
+    counters = snapshot(device, LUMI_COUNTERS)
     return LumiSegment(
         ls_number=ls_number,
-        rates_before_prescaler=blockread(device, "gt_mp7_gtlfdl.rate_cnt_before_prescaler"),
-        rates_after_prescaler=blockread(device, "gt_mp7_gtlfdl.rate_cnt_after_prescaler"),
-        deadtime_counters=blockread(device, "gt_mp7_gtlfdl.rate_cnt_post_dead_time"),
-        l1a_rate=read(args.device, "gt_mp7_gtlfdl.rate_cnt_l1a")
+        rates_before_prescaler=counters.block("gt_mp7_gtlfdl.rate_cnt_before_prescaler"),
+        rates_after_prescaler=counters.block("gt_mp7_gtlfdl.rate_cnt_after_prescaler"),
+        deadtime_counters=counters.block("gt_mp7_gtlfdl.rate_cnt_post_dead_time"),
+        l1a_rate=counters.value("gt_mp7_gtlfdl.rate_cnt_l1a")
     )
 
 parser = argparse.ArgumentParser()
@@ -75,7 +78,11 @@ if args.menu:
 TDF_NOTICE("hit CTRL + C to exit routine")
 
 # Cache for multiple luminosity segments
-lumi_segment_cache = []
+lumi_segment_cache = deque(maxlen=args.stucked_cache_size)
+
+# Counter detectors
+mismatch_detector = MismatchDetector()
+stuck_detector = StuckDetector(args.stucked_cache_size, args.stucked_threshold)
 
 # Get initial luminosity section
 previous_ls = read_lumi_counter(args.device)
@@ -106,11 +113,8 @@ with open("{0}.log".format(TDF_NAME), "w") as logger:
                     lumi_segment_cache.append(lumi_segment)
                     # Record rates to CSV file
                     if args.dump:
-                        args.dump.write(','.join([str(item) for item in [previous_ls] + lumi_segment.rates_before_prescaler]))
+                        args.dump.write(','.join([str(item) for item in [previous_ls] + list(lumi_segment.rates_before_prescaler)]))
                         args.dump.write("\n")
-                    # Strip older cache entries
-                    if len(lumi_segment_cache) > args.stucked_cache_size:
-                        lumi_segment_cache = lumi_segment_cache[-abs(args.stucked_cache_size):]
 
                     # Print table header
                     print LumiSegment.header
@@ -121,10 +125,10 @@ with open("{0}.log".format(TDF_NAME), "w") as logger:
                     # Test 1
                     # Compare before/after counter values, must match.
                     if args.missmatches:
-                        for index in range(len(lumi_segment.rates_before_prescaler)):
-                            before_cnt = lumi_segment.rates_before_prescaler[index]
-                            after_cnt = lumi_segment.rates_after_prescaler[index]
-                            if before_cnt != after_cnt:
+                        for alert in mismatch_detector.update(args.device, previous_ls, lumi_segment.rates_before_prescaler, lumi_segment.rates_after_prescaler):
+                            for index in alert.indices:
+                                before_cnt = lumi_segment.rates_before_prescaler[index]
+                                after_cnt = lumi_segment.rates_after_prescaler[index]
                                 message = "before/after counter values not equal: {before_cnt} != {after_cnt}".format(**locals())
                                 TDF_WARNING(message)
                                 logger.write(message + "\n")
@@ -134,21 +138,15 @@ with open("{0}.log".format(TDF_NAME), "w") as logger:
                     # Test 2
                     # Try to detect "stucked" counter values, over multiple past luminosity segements.
                     if args.stucked:
-                        # Wait for cache to build up
-                        if len(lumi_segment_cache) >= args.stucked_cache_size:
-                            # Check every algorithm
-                            for index in range(len(lumi_segment_cache[0].rates_after_prescaler)):
-                                # Fetch rate counters history for algorithm <index>
+                        for alert in stuck_detector.update(args.device, previous_ls, lumi_segment.rates_after_prescaler):
+                            for index in alert.indices:
                                 history = [segment.rates_after_prescaler[index] for segment in lumi_segment_cache]
-                                # Test for same values
-                                if history == ([history[0]] * len(history)): # scheme [42,42,42] == ([42] * 3)
-                                    if history[0] >= args.stucked_threshold:
-                                        message = "detected potential stucked rate counters, algorithm {index}, const. values {history}, over past {args.stucked_cache_size} lumi segments.".format(**locals())
-                                        TDF_WARNING(message)
-                                        logger.write(message + "\n")
-                                        for segment in lumi_segment_cache:
-                                            print segment.row(index, algorithm_names[index])
-                                            logger.write(segment.row(index, algorithm_names[index]) + "\n")
+                                message = "detected potential stucked rate counters, algorithm {index}, const. values {history}, over past {args.stucked_cache_size} lumi segments.".format(**locals())
+                                TDF_WARNING(message)
+                                logger.write(message + "\n")
+                                for segment in lumi_segment_cache:
+                                    print segment.row(index, algorithm_names[index])
+                                    logger.write(segment.row(index, algorithm_names[index]) + "\n")
 
                 # Store current luminosity segment number
                 previous_ls = current_ls
@@ -6,7 +6,7 @@
 #
 
 from tdf.extern import argparse
-from tdf.core.testvector import TestVector, AlgorithmDump, FinorDump
+from tdf.core.testvector import TestVector
 from tdf.core.xmlmenu import XmlMenu
 from tdf.core.settings import TDF
 from tdf.core import tty
@@ -87,30 +87,13 @@ def validate_uuid_firmware(device, menu):
             "xml      : {menu.uuid_firmware} : {menu.filename}\n" \
             "hardware : {uuid_firmware} : {device}".format(**locals()))
 
-def merge_algorithm_dumps(dumps, filename):
-    """Merge algorithm dumps. Takes list of algorithm dump objects, writes
-    merged dump to filename. Returns merged dump instance."""
-    merged = AlgorithmDump()
-    merged._algorithms = [0] * TDF.ORBIT_LENGTH # Make sure to init
-    for dump in dumps:
-        algorithms = dump.algorithms()
-        for bx in range(len(algorithms)):
-            merged._algorithms[bx] |= algorithms[bx]
+def merge_dumps(dumps, filename):
+    """Merge memory dumps of multiple modules by bitwise OR (algorithms or
+    FinOR), writes merged dump to filename. Returns merged memory image."""
+    dumps = list(dumps)
+    merged = dumps[0].__class__().merge(dumps)
     with open(filename, 'w') as fp:
-        fp.write(merged.serialize())
-    return merged
-
-def merge_finor_dumps(dumps, filename):
-    """Merge finor dumps. Takes list of FinOR dump objects, writes merged
-    dump to filename. Returns merged dump instance."""
-    merged = FinorDump()
-    merged._finor = [0] * TDF.ORBIT_LENGTH # Make sure to init
-    for dump in dumps:
-        finors = dump.finors()
-        for bx in range(len(finors)):
-            merged._finor[bx] |= finors[bx]
-    with open(filename, 'w') as fp:
-        fp.write(merged.serialize())
+        fp.write(str(merged))
     return merged
 
 parser = argparse.ArgumentParser()
@@ -184,17 +167,13 @@ try:
     # Generate set of testvectors
     run_routine("testvector_split", args.testvector, args.menu, '-o', temp_dir)
 
-    # Generate set of buffer images from splitted testvectors - keept track of that names!
-    for module in modules.keys():
-        basename = os.path.splitext(os.path.basename(args.testvector))[0]
-        tv_filename = "{basename}_module_{module}.txt".format(**locals())
-        data_filename = mkfilename(module, "in.dat")
-        buffgen(tv_filename, board=devices[module], outfile=data_filename)
-
-    for device in devices:
-        data_filename = mkfilename(module, "in.dat")
+    # Inject buffer patterns from splitted testvectors directly into RX buffers.
+    for module, device in enumerate(devices):
         if args.loopback:
-            mp7butler("buffers", device, "loopPlay", "--e", args.rx_links, "--inject", "file://{data_filename}".format(**locals()))
+            mp7butler("buffers", device, "loopPlay", "--e", args.rx_links)
+            basename = os.path.splitext(os.path.basename(args.testvector))[0]
+            tv_filename = "{basename}_module_{module}.txt".format(**locals())
+            buffinject(device, tv_filename, links=args.rx_links)
         else:
             mp7butler("buffers", device, "loopPlay")
 
@@ -240,12 +219,12 @@ try:
     # Merge dumped algorithm results
     algodump_filename = "{TDF_NAME}_merged_spymem2_algos.dat".format(**globals())
     TDF_INFO("merging dumped algorithms results to", algodump_filename)
-    merged_algo_dump = merge_algorithm_dumps(algo_dumps.values(), algodump_filename)
+    merged_algo_dump = merge_dumps(algo_dumps.values(), algodump_filename)
 
     # Merge dumped FinOR results
     finordump_filename = "{TDF_NAME}_merged_spymem2_finor.dat".format(**globals())
     TDF_INFO("merging dumped FinOR results to", finordump_filename)
-    merge_finor_dumps(finor_dumps.values(), finordump_filename)
+    merged_finor_dump = merge_dumps(finor_dumps.values(), finordump_filename)
 
     # Compare the dumps.
     basename = os.path.splitext(os.path.basename(args.testvector))[0]
@@ -261,8 +240,8 @@ try:
     print "-------------------------------------------------------"
     print ""
     print "Algo & finor summary (all modules merged):"
-    compare(devices[0], "gt_mp7_frame.spymem2_algos", algodump_filename, args.testvector, offset=args.delay + args.gtl_latency, size=args.size)
-    compare(devices[0], "gt_mp7_frame.spymem2_finor", finordump_filename, args.testvector, offset=args.delay + args.gtl_latency, size=args.size)
+    compare(devices[0], "gt_mp7_frame.spymem2_algos", merged_algo_dump, args.testvector, offset=args.delay + args.gtl_latency, size=args.size)
+    compare(devices[0], "gt_mp7_frame.spymem2_finor", merged_finor_dump, args.testvector, offset=args.delay + args.gtl_latency, size=args.size)
 
     TDF_INFO("reading testvector", args.testvector)
     tv = TestVector(args.testvector)
@@ -277,15 +256,12 @@ try:
     print "|-----|-----|------------------------------------------------------------------|--------|--------|----------|"
     print "| Mod | Idx | Name                                                             | l1a.tv | l1a.hw | Result   |"
     print "|-----|-----|------------------------------------------------------------------|--------|--------|----------|"
+    l1a_tv_counts = tv.algorithmCounts(0, args.size)
+    l1a_hw_counts = merged_algo_dump.algorithmCounts(delay_all, delay_all + args.size)
     for algorithm in algorithms:
 
-        l1a_tv = 0
-        for value in tv.algorithms()[:args.size]:
-            l1a_tv += (value >> algorithm.index) & 0x1
-
-        l1a_hw = 0
-        for value in merged_algo_dump.algorithms()[delay_all:delay_all+args.size]:
-            l1a_hw += (value >> algorithm.index) & 0x1
+        l1a_tv = l1a_tv_counts[algorithm.index]
+        l1a_hw = l1a_hw_counts[algorithm.index]
 
         if algorithm.name in ignored_algorithms:
             result_code = RESULT_IGNORED
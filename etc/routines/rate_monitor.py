@@ -0,0 +1,38 @@
+# rate_monitor.py
+# Continuous rate counter monitoring of multiple uGT and extcond devices.
+from tdf.extern import argparse
+from tdf.core.monitor import RateMonitor, DEFAULT_DEPTH
+import os
+
+parser = argparse.ArgumentParser()
+parser.add_argument('devices', nargs='+', help="uGT and extcond devices to monitor (gt_mp7.<n>, extcond_amc502.<n>)")
+parser.add_argument('-i', dest='interval', metavar='<f>', type=float, default=1., help="polling interval, default 1.0 sec")
+parser.add_argument('--depth', metavar='<n>', type=int, default=DEFAULT_DEPTH, help="number of lumi segments kept in history, default {0}".format(DEFAULT_DEPTH))
+parser.add_argument('--port', metavar='<n>', type=int, help="serve status and history by HTTP on localhost port")
+parser.add_argument('--csv', metavar='<dir>', help="export counter history to CSV files in directory on exit")
+parser.add_argument('--stucked-cache-size', metavar='<n>', type=int, default=3, help="number of lumi segments checked for stucked counters, default 3")
+parser.add_argument('--stucked-threshold', metavar='<n>', type=int, default=10, help="threshold for detecting stucked counters, default >= 10")
+args = parser.parse_args(TDF_ARGS)
+
+monitor = RateMonitor(read, snapshot, interface, args.devices, args.depth, args.stucked_cache_size, args.stucked_threshold)
+
+if args.port:
+    server = monitor.serve(args.port)
+
+TDF_NOTICE("hit CTRL + C to exit routine")
+
+try:
+    monitor.run(args.interval)
+except KeyboardInterrupt:
+    monitor.stop()
+    TDF_NOTICE("stopped monitoring")
+
+# Export counter history
+if args.csv:
+    if not os.path.isdir(args.csv):
+        os.makedirs(args.csv)
+    for device, item in sorted(monitor.rings.keys()):
+        filename = os.path.join(args.csv, "{device}_{item}.csv".format(**locals()))
+        with open(filename, 'w') as fp:
+            monitor.writeCsv(device, item, fp)
+        TDF_INFO("written", filename)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2013-2017 Bernhard Arnold <bernahrd.arnold@cern.ch>
+#
+
+"""This module provides a BX offset scan to align memory dumps with a
+reference (eg. a test vector).
+
+All cyclic offsets are evaluated at once. For every value its positions in
+both sequences are collected; each pair of equal values contributes a match to
+the offset given by the difference of their positions. Frequent values (like
+empty BX) are handled using rotated bit masks, one AND and bit count per
+offset, instead of enumerating all pairs.
+
+Example
+-------
+
+    >>> scores = scan_offsets([('finor', [0, 0, 1, 0])], [('finor', [1, 0, 0, 0])])
+    >>> scores[0]
+    OffsetScore(offset=2, mismatches=0, types={'finor': 0})
+
+"""
+
+from collections import namedtuple, defaultdict
+
+__all__ = [ 'OffsetScore', 'match_counts', 'scan_offsets', '__doc__', ]
+
+DENSE_FACTOR = 8
+"""Values producing more than DENSE_FACTOR times sequence length position
+pairs are matched using rotated bit masks."""
+
+class OffsetScore(namedtuple('OffsetScore', 'offset, mismatches, types')):
+    """Mismatch score of a BX offset, *mismatches* is the number of BX with any
+    mismatch, *types* a dictionary of mismatching BX by object type."""
+
+def positions(values, size=None):
+    """Returns dictionary of value positions in sequence *values*, optional
+    *size* limits the range of positions."""
+    result = defaultdict(list)
+    for i, value in enumerate(values[:size]):
+        result[value].append(i)
+    return result
+
+def match_counts(a, b, size=None):
+    """Returns list of match counts for every cyclic offset of sequence *a*
+    compared with sequence *b*. Count at *offset* is the number of positions
+    *i* < *size* where a[(i + offset) % len(a)] == b[i].
+
+    >>> match_counts([1, 2, 3], [2, 3, 1])
+    [0, 3, 0]
+    """
+    n = len(a)
+    size = min(n, len(b)) if size is None else min(size, n, len(b))
+    counts = [0] * n
+    positions_a = positions(a)
+    for value, pb in positions(b, size).iteritems():
+        pa = positions_a.get(value)
+        if not pa:
+            continue
+        if len(pa) * len(pb) <= DENSE_FACTOR * n:
+            for i in pa:
+                for j in pb:
+                    counts[(i - j) % n] += 1
+        else:
+            mask_a = 0
+            for i in pa:
+                mask_a |= 1 << i
+            # Doubled mask, shifting by offset yields the cyclic rotation.
+            mask_a |= mask_a << n
+            mask_b = 0
+            for j in pb:
+                mask_b |= 1 << j
+            for offset in range(n):
+                counts[offset] += bin((mask_a >> offset) & mask_b).count('1')
+    return counts
+
+def scan_offsets(a, b, size=None, limit=None):
+    """Scan all BX offsets of object columns *a* against reference columns
+    *b*, both lists of tuples (type, values) with *values* a sequence of
+    hashable values per BX (eg. a tuple of all objects of a type). Returns
+    list of OffsetScore ranked by number of mismatching BX, optional *limit*
+    returns only the best ranked offsets.
+    """
+    types = [name for name, _ in a]
+    a, b = dict(a), dict(b)
+    n = len(a[types[0]])
+    # Compare only BX present in both objects and reference.
+    size = min(n, len(b[types[0]])) if size is None else min(size, n, len(b[types[0]]))
+    counts = {}
+    for name in types:
+        counts[name] = match_counts(a[name], b[name], size)
+    # BX matches for all types at once.
+    combined = match_counts(zip(*[a[name] for name in types]), zip(*[b[name] for name in types]), size)
+    scores = []
+    for offset in range(n):
+        mismatches = dict([(name, size - counts[name][offset]) for name in types])
+        scores.append(OffsetScore(offset, size - combined[offset], mismatches))
+    scores.sort(key=lambda score: (score.mismatches, score.offset))
+    return scores[:limit]
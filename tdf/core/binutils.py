@@ -8,10 +8,16 @@
 
 import re
 import uuid
+import string
+from array import array
+from binascii import unhexlify
 
-__all__ = [ 'bitmask', 'charcount', 'requires', 'bitsplit', 'bitjoin',
+BIT_BYTES = string.maketrans('01', '\x00\x01')
+"""Translation table of binary digits to byte values 0 and 1."""
+
+__all__ = [ 'bitmask', 'charcount', 'requires', 'bitsplit', 'bitjoin', 'bitscan', 'bitcounts', 'diffranges',
     'hexencode', 'hexdecode', 'uuidencode', 'uuiddecode',
-    'BitVector', 'BitStream', 'BitStreamReader', '__doc__', ]
+    'BitVector', 'BitStream', 'BitStreamReader', 'BitPlanes', '__doc__', ]
 
 def bitmask(n):
     """Calculates bitmask for *n* bits.
@@ -73,6 +79,77 @@ def bitjoin(values, width):
         i += 1
     return result
 
+# Set bit positions for every byte value, used by bitscan().
+BITSCAN_TABLE = [tuple(n for n in range(8) if byte & (1 << n)) for byte in range(256)]
+
+def bitscan(value):
+    """Returns list of set bit positions of *value* in ascending order.
+    Scans bytewise using a lookup table, suited for sparse and dense values.
+    >>> bitscan(0x8005)
+    [0, 2, 15]
+    """
+    if not value:
+        return []
+    digits = '{0:x}'.format(value)
+    data = bytearray(unhexlify(digits if not len(digits) & 1 else '0' + digits))
+    data.reverse()
+    positions = []
+    offset = 0
+    for byte in data:
+        if byte:
+            positions.extend([offset + n for n in BITSCAN_TABLE[byte]])
+        offset += 8
+    return positions
+
+def bitcounts(values, width):
+    """Returns list of population counts for every bit position of *values*
+    (eg. the number of BX an algorithm fired). Values are added to a bit
+    sliced counter (one packed bit-plane per counter bit), so a value costs a
+    few big integer operations independent of its width.
+    >>> bitcounts([0b011, 0b110, 0b010], 3)
+    [1, 3, 1]
+    """
+    planes = []
+    for value in values:
+        carry = value
+        for k in range(len(planes)):
+            if not carry:
+                break
+            planes[k], carry = planes[k] ^ carry, planes[k] & carry
+        if carry:
+            planes.append(carry)
+    counts = [0] * width
+    for k, plane in enumerate(planes):
+        for n in bitscan(plane):
+            if n < width:
+                counts[n] += 1 << k
+    return counts
+
+def diffranges(values, reference, gap=0):
+    """Returns list of (offset, values) tuples of all word ranges of *values*
+    differing from *reference*. Ranges separated by up to *gap* equal words
+    are merged (saves transactions on scattered changes).
+    >>> diffranges([1, 2, 3, 4, 5], [1, 0, 3, 0, 5])
+    [(1, [2]), (3, [4])]
+    >>> diffranges([1, 2, 3, 4, 5], [1, 0, 3, 0, 5], gap=1)
+    [(1, [2, 3, 4])]
+    """
+    if len(values) != len(reference):
+        raise ValueError("size mismatch: {0} != {1}".format(len(values), len(reference)))
+    ranges = []
+    begin = end = None
+    for i, value in enumerate(values):
+        if value != reference[i]:
+            if begin is None:
+                begin = i
+            elif i - end > gap + 1:
+                ranges.append((begin, list(values[begin:end + 1])))
+                begin = i
+            end = i
+    if begin is not None:
+        ranges.append((begin, list(values[begin:end + 1])))
+    return ranges
+
 def bitdecode(value, slices={}):
     """Decodes value to bit slices.
     >>> bitdecode(0xdeadbeef, dict(foo=(15,0), bar=(31,16)'))
@@ -277,3 +354,116 @@ class BitField(object):
     def charcount(self):
         """Number of hex characters reqired to represent bit field."""
         return charcount(self.width)
+
+class BitPlanes(object):
+    """Transposed bit-plane view of a sequence of *width* bit values, one
+    bitset (integer) per bit position. Bit *i* of plane *n* represents bit *n*
+    of value *i*, eg. plane 42 of an algorithm view holds all BX algorithm 42
+    fired. Per bit queries are operations on a single packed integer.
+
+    >>> planes = BitPlanes([0b01, 0b11, 0b10], 2)
+    >>> planes.indices(0)
+    [0, 1]
+    >>> planes.count(1)
+    2
+    """
+
+    def __init__(self, values, width):
+        self._width = width
+        self._length = len(values)
+        self._planes = [0] * width
+        if values:
+            # Transpose binary strings, least significant bit first.
+            mask = bitmask(width)
+            rows = ['{0:0{1}b}'.format(value & mask, width)[::-1] for value in values]
+            self._planes = [int(''.join(column)[::-1], 2) for column in zip(*rows)]
+
+    @classmethod
+    def fromPlanes(cls, planes, length):
+        """Create view from list of bitsets *planes* holding *length* values."""
+        view = cls([], len(planes))
+        view._planes = list(planes)
+        view._length = length
+        return view
+
+    @property
+    def width(self):
+        """Number of bit planes."""
+        return self._width
+
+    def __len__(self):
+        return self._length
+
+    def plane(self, n):
+        """Returns bitset of bit position *n*."""
+        return self._planes[n]
+
+    def test(self, n, i):
+        """Returns True if bit *n* of value *i* is set."""
+        return bool((self._planes[n] >> i) & 0x1)
+
+    def count(self, n, begin=0, end=None):
+        """Returns number of values with bit *n* set, optionally limited to
+        the range *begin* to *end*."""
+        end = self._length if end is None else min(end, self._length)
+        if end <= begin:
+            return 0
+        return bin((self._planes[n] >> begin) & bitmask(end - begin)).count('1')
+
+    def indices(self, n):
+        """Returns list of value indices with bit *n* set."""
+        return bitscan(self._planes[n])
+
+    def set(self, n, i, value):
+        """Set or clear bit *n* of value *i*."""
+        if value:
+            self._planes[n] |= 1 << i
+        else:
+            self._planes[n] &= ~(1 << i)
+
+    def update(self, i, value):
+        """Update all bit planes with new *value* at index *i*."""
+        for n in range(self._width):
+            self.set(n, i, (value >> n) & 0x1)
+
+    def mask(self, value):
+        """Clear all bit planes not set in *value*."""
+        for n in range(self._width):
+            if not (value >> n) & 0x1:
+                self._planes[n] = 0
+
+    def values(self, begin=0, end=None):
+        """Returns list of values, inverse of the transposition. Optional
+        *begin* and *end* select a range of bit planes, eg. the planes of a
+        single 32 bit memory column."""
+        if not self._length:
+            return []
+        mask = bitmask(self._length)
+        planes = [plane & mask for plane in self._planes[begin:end]]
+        total = self._length * len(planes)
+        ones = sum([bin(plane).count('1') for plane in planes])
+        # Scatter the minority bits of sparse or dense planes (eg. masks),
+        # transposition is cheaper for mixed content.
+        if ones * 6 < total:
+            values = [0] * self._length
+            for n, plane in enumerate(planes):
+                bit = 1 << n
+                for i in bitscan(plane):
+                    values[i] |= bit
+            return values
+        if (total - ones) * 6 < total:
+            values = [bitmask(len(planes))] * self._length
+            for n, plane in enumerate(planes):
+                bit = ~(1 << n)
+                for i in bitscan(~plane & mask):
+                    values[i] &= bit
+            return values
+        rows = ['{0:0{1}b}'.format(plane, self._length)[::-1] for plane in planes]
+        return [int(''.join(row)[::-1], 2) for row in zip(*rows)]
+
+    def bits(self, n):
+        """Returns byte array of bit *n* (0 or 1) of all values."""
+        if not self._length:
+            return array('B')
+        plane = self._planes[n] & bitmask(self._length)
+        return array('B', '{0:0{1}b}'.format(plane, self._length)[::-1].translate(BIT_BYTES))
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2013-2017 Bernhard Arnold <bernahrd.arnold@cern.ch>
+#
+
+"""This module provides a compact columnar file format for memory image
+analysis.
+
+The file is a NumPy compatible *.npz* archive (ZIP container of *.npy* arrays)
+written without requiring NumPy. Every column is stored as one array member,
+metadata (device, item, timestamp, menu UUID, ...) is stored as JSON member
+*__metadata__.json*.
+
+Example
+-------
+
+    >>> write_columns('spy.npz', [('muon_0.pt', array('I', [0, 42]))], device='gt_mp7.1')
+    >>> metadata, columns = read_columns('spy.npz')
+
+Using NumPy for analysis
+
+    >>> data = numpy.load('spy.npz')
+    >>> data['muon_0.pt']
+    array([ 0, 42], dtype=uint32)
+
+"""
+
+from array import array
+import zipfile
+import json
+import sys
+import ast
+import re
+
+__all__ = [ 'write_columns', 'read_columns', '__doc__', ]
+
+FORMAT_VERSION = 1
+"""Columnar file format version stored in metadata."""
+
+METADATA_NAME = '__metadata__.json'
+"""Archive member name of metadata."""
+
+NPY_MAGIC = '\x93NUMPY\x01\x00'
+"""NPY format version 1.0 magic string."""
+
+NPY_HEADER_REGEX = re.compile(r"^\{.*\}\s*$", re.S)
+
+def npy_descr(typecode, itemsize):
+    """Returns NPY type description for array *typecode* and *itemsize*.
+    >>> npy_descr('I', 4)
+    '<u4'
+    """
+    kind = 'u' if typecode in 'BHIL' else 'i' if typecode in 'bhil' else 'f'
+    endian = '|' if itemsize == 1 else '<'
+    return '{endian}{kind}{itemsize}'.format(**locals())
+
+def npy_typecode(descr):
+    """Returns array typecode for NPY type description."""
+    kind, itemsize = descr[1], int(descr[2:])
+    for typecode in {'u': 'BHIL', 'i': 'bhil', 'f': 'fd'}[kind]:
+        if array(typecode).itemsize == itemsize:
+            return typecode
+    raise ValueError("unsupported NPY data type `{descr}'".format(**locals()))
+
+def npy_encode(values):
+    """Returns NPY encoded string of array *values*."""
+    header = "{{'descr': '{0}', 'fortran_order': False, 'shape': ({1},), }}".format(
+        npy_descr(values.typecode, values.itemsize), len(values))
+    # Pad header with spaces, total header size must be aligned to 16 bytes.
+    padding = 16 - (len(NPY_MAGIC) + 2 + len(header) + 1) % 16
+    header = header + ' ' * (padding % 16) + '\n'
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return ''.join((NPY_MAGIC, chr(len(header) & 0xff), chr(len(header) >> 8), header, values.tostring()))
+
+def npy_decode(data):
+    """Returns array decoded from NPY encoded string *data*."""
+    if not data.startswith('\x93NUMPY'):
+        raise ValueError("not a NPY array")
+    length = ord(data[8]) | (ord(data[9]) << 8)
+    header = data[10:10 + length]
+    if not NPY_HEADER_REGEX.match(header):
+        raise ValueError("invalid NPY header")
+    header = ast.literal_eval(header)
+    if header['fortran_order'] or len(header['shape']) != 1:
+        raise ValueError("only one dimensional NPY arrays are supported")
+    values = array(npy_typecode(header['descr']))
+    values.fromstring(data[10 + length:])
+    if sys.byteorder != 'little' and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+def write_columns(filename, columns, **metadata):
+    """Write list of (name, array) tuples *columns* to compressed columnar file
+    *filename*. Additional keyword arguments are stored as metadata."""
+    metadata = dict(metadata, format_version=FORMAT_VERSION, columns=[name for name, _ in columns])
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(METADATA_NAME, json.dumps(metadata, sort_keys=True))
+        for name, values in columns:
+            archive.writestr('{0}.npy'.format(name), npy_encode(values))
+
+def read_columns(filename):
+    """Read columnar file *filename*, returns tuple of metadata dictionary and
+    dictionary of arrays."""
+    with zipfile.ZipFile(filename, 'r') as archive:
+        metadata = json.loads(archive.read(METADATA_NAME))
+        columns = {}
+        for name in metadata['columns']:
+            columns[name] = npy_decode(archive.read('{0}.npy'.format(name)))
+    return metadata, columns
@@ -121,7 +121,12 @@ class TDFCommandLine(object):
         sub.add_argument('item', help="memory item defined in address table").completer = ItemsCompleter
         group = sub.add_mutually_exclusive_group()
         group.add_argument('--decode', action='store_true', help="decode to JSON")
+        group.add_argument('--ndjson', action='store_true', help="decode to newline delimited JSON, one record per BX")
+        group.add_argument('--npz', action='store_true', help="export decoded columns to compact columnar file (requires -o)")
         group.add_argument('--raw', action='store_true', help="return raw data format")
+        sub.add_argument('--uuid', metavar='<uuid>', help="menu UUID stored in columnar file metadata (--npz only)")
+        sub.add_argument('--objects', metavar='<list>', type=lambda s: s.split(','), help="comma separated object types to be decoded, eg. muon,eg (--ndjson only)")
+        sub.add_argument('--skip-empty', action='store_true', help="omit empty objects and BX (--ndjson only)")
         sub.add_argument('-o', '--outfile', metavar='<file>', default=sys.stdout, help="write output to file, default is stdout")
         sub.set_defaults(func=self.cmd_dump)
 
@@ -150,6 +155,16 @@ class TDFCommandLine(object):
         sub.add_argument('-o', '--outfile', metavar='<file>', default=sys.stdout, type=argparse.FileType('w'), help="write output to file")
         sub.set_defaults(func=self.cmd_compare)
 
+        sub = command.add_parser('align', help="scan all BX offsets of memory dump against test vector file")
+        sub.add_argument('device', help="device defined in connections file").completer = DevicesCompleter
+        sub.add_argument('item', help="memory item defined in address table").completer = ItemsCompleter
+        sub.add_argument('dump',  type=argparse.FileType('rb'), help="memory dump file")
+        sub.add_argument('testvector',  help="emulator test vector file")
+        sub.add_argument('--size', metavar='<bx>', default=TDF.ORBIT_LENGTH, type=int, help="number of bx to compare")
+        sub.add_argument('--limit', metavar='<n>', default=10, type=int, help="number of best offsets to show, default is 10")
+        sub.add_argument('-o', '--outfile', metavar='<file>', default=sys.stdout, type=argparse.FileType('w'), help="write output to file")
+        sub.set_defaults(func=self.cmd_align)
+
         sub = command.add_parser('wait', help="wait for item until it contains value or timeout")
         sub.add_argument('device', help="device defined in connections file").completer = DevicesCompleter
         sub.add_argument('item', help="memory item defined in address table").completer = ItemsCompleter
@@ -163,9 +178,19 @@ class TDFCommandLine(object):
         sub.add_argument('-q', '--quads', metavar='<n>', default=18, type=int, help="number of quads, default 18")
         sub.add_argument('-f', '--frames', metavar='<n>', default=1024, type=int, help="number of frames, default 1024")
         sub.add_argument('-b', '--board', metavar='<id>', default='MP7_TEST', help="board ID, default MP7_TEST")
-        sub.add_argument('-o', '--outfile', metavar='<file>', default=sys.stdout, type=argparse.FileType('w'), help="write output to file")
+        sub.add_argument('-o', '--outfile', metavar='<file>', default=sys.stdout, type=argparse.FileType('wb'), help="write output to file")
+        sub.add_argument('--binary', action='store_true', help="write compact binary buffer format")
         sub.set_defaults(func=self.cmd_buffgen)
 
+        sub = command.add_parser('buffinject', help="write MP7 buffer patterns directly into RX/TX buffers")
+        sub.add_argument('device', help="device defined in connections file").completer = DevicesCompleter
+        sub.add_argument('pattern', default=':counter', nargs='?', help="type of generated pattern (:zero, :counter), binary buffer or test vector file, default is `:counter'")
+        sub.add_argument('-e', '--links', metavar='<n-m>', help="links to be injected (eg. 0-15), default all links")
+        sub.add_argument('--path', choices=('rx', 'tx'), default='rx', help="buffer path, default is `rx'")
+        sub.add_argument('-q', '--quads', metavar='<n>', default=18, type=int, help="number of quads, default 18")
+        sub.add_argument('-f', '--frames', metavar='<n>', default=1024, type=int, help="number of frames, default 1024")
+        sub.set_defaults(func=self.cmd_buffinject)
+
         sub = command.add_parser('mp7butler', help="wrapper to execute MP7 butler software")
         sub.add_argument('args', nargs=argparse.REMAINDER, help="mp7butler specific arguments")
         sub.set_defaults(func=self.cmd_mp7butler)
@@ -218,7 +243,7 @@ class TDFCommandLine(object):
         self.core.configure(args.device, args.filename, args.verify)
 
     def cmd_dump(self, args):
-        self.core.dump(args.device, args.item, args.raw, args.decode, args.outfile)
+        self.core.dump(args.device, args.item, args.raw, args.decode, args.outfile, args.ndjson, args.objects, args.skip_empty, args.npz, args.uuid)
 
     def cmd_load(self, args):
         self.core.load(args.device, args.item, args.filename, args.verify)
@@ -229,11 +254,17 @@ class TDFCommandLine(object):
     def cmd_compare(self, args):
         self.core.compare(args.device, args.item, args.dump, args.testvector, args.offset, args.size, args.outfile)
 
+    def cmd_align(self, args):
+        self.core.align(args.device, args.item, args.dump, args.testvector, args.size, args.limit, args.outfile)
+
     def cmd_wait(self, args):
         self.core.wait(args.device, args.item, args.value, args.timeout, args.interval)
 
     def cmd_buffgen(self, args):
-        self.core.buffgen(args.pattern, args.quads, args.frames, args.board, args.outfile)
+        self.core.buffgen(args.pattern, args.quads, args.frames, args.board, args.outfile, args.binary)
+
+    def cmd_buffinject(self, args):
+        self.core.buffinject(args.device, args.pattern, args.links, args.path, args.quads, args.frames)
 
     def cmd_mp7butler(self, args):
         try:
@@ -11,26 +11,20 @@ import uhal
 import subprocess
 import logging
 import inspect
+import importlib
 import tempfile
+import threading
+from array import array
 import time
 import sys, os
 
 from tdf.core.settings import TDF
 from tdf.core import binutils
-from tdf.core.cfgreader import ConfigFileReader
-from tdf.core.translator import ItemTranslator
-from tdf.extcond.images import *
-from tdf.finor.images import *
-from tdf.mp7.images import *
-from tdf.core.images import GenericMemoryImage
-from tdf.mp7.buffgen import Buffgen
-
-from tdf.core.testvector import TestVector
-from tdf.core.filereader import FileReader
-from tdf.core.binutils import charcount
-from tdf.core.scripts import ScriptRunner
 from tdf.core.logger import *
 
+# Note: memory images, translator, buffer generator and script runner modules
+# are imported on demand to keep startup of the command line tools fast.
+
 __all__ = ['TDFCore', '__doc__', ]
 
 MP7_EXECUTABLE = 'mp7butler.py'
@@ -39,6 +33,13 @@ MP7_EXECUTABLE = 'mp7butler.py'
 AMC502_EXECUTABLE = 'amc502butler.py'
 """Executable name for the AMC502 butler software."""
 
+BUFFER_PATHS = {'rx': 0, 'tx': 1}
+"""MP7 datapath buffer selection (txrx_sel)."""
+
+UPLOAD_GAP = 8
+"""Differing word ranges separated by up to UPLOAD_GAP equal words are
+uploaded in a single block write."""
+
 def DEBUG_API(frame=inspect.currentframe()):
     """Inspect function call and pass details to debug logger.
     >>> DEBUG_API(inspect.currentframe())
@@ -49,13 +50,37 @@ def DEBUG_API(frame=inspect.currentframe()):
     arglist = ', '.join(("{0}='{1}'".format(arg, values[arg]) for arg in args if arg != 'self'))
     debug("{cls}.{attr}( {arglist} )".format(**locals()))
 
+IMAGE_MODULES = (
+    'tdf.extcond.images',
+    'tdf.finor.images',
+    'tdf.mp7.images',
+)
+"""Modules providing memory image classes referenced by address tables."""
+
+_image_classes = {}
+
+def imageClasses():
+    """Returns dictionary of memory image classes referenced by address table
+    *class* parameter. Image modules are imported on first call."""
+    if not _image_classes:
+        from tdf.core.images import GenericMemoryImage
+        for name in IMAGE_MODULES:
+            module = importlib.import_module(name)
+            for attr in dir(module):
+                obj = getattr(module, attr)
+                if inspect.isclass(obj) and issubclass(obj, GenericMemoryImage):
+                    _image_classes[attr] = obj
+    return _image_classes
+
 def toImage(node):
     """Factory convert node to empty memory image object."""
+    from tdf.core.images import GenericMemoryImage
     parameters = node.getParameters()
     if 'class' in parameters.keys():
         class_ = parameters['class']
-        if class_ in globals().keys():
-            image = globals()[class_]()
+        classes = imageClasses()
+        if class_ in classes:
+            image = classes[class_]()
             return image
     image = GenericMemoryImage(node.getSize())
     return image
@@ -67,7 +92,9 @@ class TDFCore(object):
         DEBUG_API(inspect.currentframe())
         self.connections = connections
         self.connectionManager = uhal.ConnectionManager(connections)
-        self.translator = ItemTranslator()
+        self._translator = None
+        self._snapshots = {}
+        self._snapshotsLock = threading.RLock()
         self.verbose = verbose
         self.stdout = sys.stdout
 
@@ -78,6 +105,22 @@ class TDFCore(object):
         info("TDF.AMC502_ROOT_DIR:", TDF.AMC502_ROOT_DIR)
         info("XML connections file:", self.connections)
 
+    @property
+    def translator(self):
+        """Item translator, created on first use (reads enumeration settings)."""
+        if self._translator is None:
+            from tdf.core.translator import ItemTranslator
+            self._translator = ItemTranslator()
+        return self._translator
+
+    def interface(self, device):
+        """Returns uHAL hardware interface of *device*. Resolve interfaces in
+        the main thread before accessing devices from worker threads (see
+        multiread(), upload()).
+        """
+        DEBUG_API(inspect.currentframe())
+        return self.connectionManager.getDevice(device)
+
     def _getNode(self, device, item):
         """Helper, returns uHAL node by *item* from *device*."""
         device = self.connectionManager.getDevice(device)
@@ -102,6 +145,47 @@ class TDFCore(object):
         info("read 0x{value:0x} from {device}:{item}".format(**locals()))
         return int(value)
 
+    def multiread(self, device, items, translate=False, timeout=None, hw=None):
+        """Read values of multiple *items* of *device* in a single dispatch,
+        returns dictionary of values by item (integer for single registers,
+        list for blocks). If *translate* is True all values are translated,
+        alternatively *translate* lists the items to be translated. Optional
+        *timeout* sets the IPbus transaction timeout in milliseconds for this
+        read only (eg. short timeouts for probing absent boards). Optional *hw* is the hardware
+        interface of *device* already resolved by interface(), required when
+        reading from worker threads.
+
+        >>> multiread('gt_mp7.1', ['ctrl.id', 'gt_mp7_gtlfdl.read_versions.l1tm_name'], translate=['gt_mp7_gtlfdl.read_versions.l1tm_name'])
+        {'ctrl.id': 1297109040, 'gt_mp7_gtlfdl.read_versions.l1tm_name': 'L1Menu_Sample'}
+        """
+        DEBUG_API(inspect.currentframe())
+        if hw is None:
+            hw = self.connectionManager.getDevice(device)
+        nodes = dict([(item, hw.getNode(item)) for item in items])
+        payloads = {}
+        for item, node in nodes.items():
+            payloads[item] = node.readBlock(node.getSize()) if node.getSize() > 1 else node.read()
+        if timeout is None:
+            hw.dispatch()
+        else:
+            # Interfaces are shared, restore the previous timeout.
+            previous = hw.getTimeoutPeriod()
+            hw.setTimeoutPeriod(int(timeout))
+            try:
+                hw.dispatch()
+            finally:
+                hw.setTimeoutPeriod(previous)
+        values = {}
+        for item, payload in payloads.items():
+            if nodes[item].getSize() > 1:
+                values[item] = [int(value) for value in payload]
+            else:
+                values[item] = int(payload)
+            if translate is True or (translate and item in translate):
+                values[item] = self.translator.translate(nodes[item], values[item])
+        info("read {0} items from {device}".format(len(values), **locals()))
+        return values
+
     def write(self, device, item, value, verify=False):
         """Writs a single value to an *item*. If *verify* is True, raises an
         assertion error on readback missmatch.
@@ -143,6 +227,115 @@ class TDFCore(object):
                 readback = readbacks[i]
                 assert readback == value, "blockwrite(): verification mismatch: {device} {item} offset={i} write=0x{value:08x} read=0x{readback:08x}".format(**locals())
 
+    def upload(self, devices, images, gap=UPLOAD_GAP, verify=False):
+        """Upload memory *images* (dictionary of item and memory image or list
+        of values) to all *devices* in parallel. The current memory content is
+        read first and only differing word ranges are written, ranges separated
+        by up to *gap* equal words are merged. Returns dictionary of number of
+        words written by device.
+
+        >>> upload(['gt_mp7.1', 'gt_mp7.2'], {'gt_mp7_gtlfdl.masks': image})
+        {'gt_mp7.1': 2, 'gt_mp7.2': 0}
+        """
+        DEBUG_API(inspect.currentframe())
+        payloads = {}
+        for item, image in images.items():
+            values = image.serialize() if hasattr(image, 'serialize') else image
+            payloads[item] = [binutils.integer(value) for value in values]
+        # Resolve hardware interfaces up front, one worker thread per device.
+        interfaces = [(device, self.interface(device)) for device in devices]
+        results = {}
+        errors = []
+        def worker(device, hw):
+            try:
+                results[device] = self._uploadDevice(device, hw, payloads, gap, verify)
+            except Exception, e:
+                errors.append((device, e))
+        threads = [threading.Thread(target=worker, args=interface) for interface in interfaces]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            device, e = sorted(errors)[0]
+            raise RuntimeError("upload to {device} failed: {e}".format(**locals()))
+        return results
+
+    def _uploadDevice(self, device, hw, payloads, gap, verify):
+        """Helper, uploads differing word ranges of *payloads* to *device*
+        using one dispatch for reading and one for writing."""
+        nodes = dict([(item, hw.getNode(item)) for item in payloads])
+        readable = [item for item in payloads if nodes[item].getPermission() == uhal.NodePermission.READWRITE]
+        readbacks = dict([(item, nodes[item].readBlock(len(payloads[item]))) for item in readable])
+        if readbacks:
+            hw.dispatch()
+        count = 0
+        for item, values in payloads.items():
+            if item in readbacks:
+                ranges = binutils.diffranges(values, [int(value) for value in readbacks[item]], gap)
+            else:
+                ranges = [(0, values)]
+            for offset, words in ranges:
+                nodes[item].writeBlockOffset(words, offset)
+                count += len(words)
+            info("uploading {0} ranges to {device}:{item}".format(len(ranges), **locals()))
+        if count:
+            hw.dispatch()
+        if verify and readable:
+            readbacks = dict([(item, nodes[item].readBlock(len(payloads[item]))) for item in readable])
+            hw.dispatch()
+            for item in readable:
+                for i, value in enumerate(payloads[item]):
+                    readback = int(readbacks[item][i])
+                    assert readback == value, "upload(): verification mismatch: {device} {item} offset={i} write=0x{value:08x} read=0x{readback:08x}".format(**locals())
+        return count
+
+    def snapshot(self, device, items, history=None, hw=None):
+        """Read registers and counter blocks *items* of *device* in a single
+        dispatch, returns a timestamped Snapshot. The snapshot is appended to
+        the device's history (see snapshots()), optional *history* sets the
+        number of snapshots kept. Optional *hw* is the hardware interface of
+        *device* already resolved by interface(), required when reading from
+        worker threads.
+
+        >>> snapshot('gt_mp7.1', ['gt_mp7_gtlfdl.rate_cnt_l1a', 'gt_mp7_gtlfdl.rate_cnt_after_prescaler'])
+        Snapshot(device='gt_mp7.1', timestamp=..., items=(...), values=(...))
+        """
+        DEBUG_API(inspect.currentframe())
+        from tdf.core.snapshot import Snapshot, DWORD_TYPECODE
+        if hw is None:
+            hw = self.connectionManager.getDevice(device)
+        items = tuple(items)
+        payloads = []
+        for item in items:
+            node = hw.getNode(item)
+            # Note: single registers are read masked.
+            payloads.append(node.readBlock(node.getSize()) if node.getSize() > 1 else [node.read()])
+        hw.dispatch()
+        timestamp = time.time()
+        values = tuple([array(DWORD_TYPECODE, [int(value) for value in payload]) for payload in payloads])
+        snapshot = Snapshot(device, timestamp, items, values)
+        with self._snapshotsLock:
+            self.snapshots(device, history).append(snapshot)
+        return snapshot
+
+    def snapshots(self, device, history=None):
+        """Returns ring buffer of recent snapshots of *device*, optional
+        *history* sets the number of snapshots kept. Histories are shared with
+        snapshot() worker threads, do not keep the returned buffer across
+        resizes."""
+        from tdf.core.snapshot import SnapshotHistory, SNAPSHOT_HISTORY
+        with self._snapshotsLock:
+            buffer = self._snapshots.get(device)
+            if buffer is None:
+                buffer = self._snapshots[device] = SnapshotHistory(history or SNAPSHOT_HISTORY)
+            elif history is not None and history != buffer.maxlen:
+                # Resize ring buffer, keeping the most recent snapshots.
+                resized = self._snapshots[device] = SnapshotHistory(history)
+                resized.extend(buffer)
+                buffer = resized
+            return buffer
+
     def configure(self, device, filename, verify=False):
         """Configure device from configuration file. If *verify* is set to
         *True* every write access is verified by reading back the value. This
@@ -151,6 +344,7 @@ class TDFCore(object):
         DEBUG_API(inspect.currentframe())
         filename = os.path.abspath(filename)
         info("loading configuration file: {filename}".format(**locals()))
+        from tdf.core.cfgreader import ConfigFileReader
         config = ConfigFileReader(filename)
         # Get valid device nodes to check configuration file compatibility.
         valid_names = self.connectionManager.getDevice(device).getNodes()
@@ -162,20 +356,42 @@ class TDFCore(object):
             self.write(device, item, value, verify)
         info("done.")
 
-    def dump(self, device, item, raw=False, decode=False, outfile=None):
+    def dump(self, device, item, raw=False, decode=False, outfile=None, ndjson=False, objects=None, skip_empty=False, columnar=False, uuid=None):
+        """Dump memory *item* of *device* to *outfile*. If *decode* is True
+        objects are decoded to JSON, if *ndjson* is True decoded objects are
+        streamed as one JSON record per BX. Optional *objects* selects the
+        object types to be streamed, *skip_empty* omits empty objects. If
+        *columnar* is True the image columns are exported to a compact
+        columnar file (*.npz), optional menu *uuid* is stored as metadata.
+        """
         DEBUG_API(inspect.currentframe())
         node = self._getNode(device, item)
         bytes_ = node.getSize()*4
         values = self.blockread(device, item)
         parameters = node.getParameters()
+        from tdf.core.images import GenericMemoryImage
         image = toImage(node) if not raw else GenericMemoryImage(node.getSize())
         info("decoding memory content".format(**locals()))
         image.deserialize(values)
+        if columnar:
+            if not isinstance(outfile, str):
+                raise RuntimeError("columnar export requires an output filename")
+            if not hasattr(image, 'exportColumns'):
+                raise RuntimeError("memory image {0} does not support columnar export".format(image.__class__.__name__))
+            outfile = os.path.abspath(outfile)
+            info("exporting columns to file: {outfile}".format(**locals()))
+            image.exportColumns(outfile, device=device, item=item, uuid=uuid)
+            return image
         if outfile:
             if isinstance(outfile, str):
                 outfile = os.path.abspath(outfile)
                 info("writing formatted data to file: {outfile}".format(**locals()))
             with (open(outfile, 'wb') if isinstance(outfile, str) else outfile) as fp:
+                if ndjson and hasattr(image, 'decodeStream'):
+                    count = image.decodeStream(fp, objects, skip_empty)
+                    info("written {count} records".format(**locals()))
+                    fp.flush()
+                    return image
                 if decode and hasattr(image, 'decode'):
                     fp.write(image.decode())
                 else:
@@ -207,10 +423,16 @@ class TDFCore(object):
         self.blockwrite(device, item, [0x0] * node.getSize(), verify)
 
     def compare(self, device, item, dump, pattern, offset=0, size=TDF.ORBIT_LENGTH, outfile=sys.stdout):
+        """Compare memory *dump* (filename, file or memory image) with
+        reference *pattern* (test vector or dump)."""
         DEBUG_API(inspect.currentframe())
+        from tdf.core.images import GenericMemoryImage
         node = self._getNode(device, item)
-        image = toImage(node)
-        image.read(open(dump, 'rb') if isinstance(dump, str) else dump)
+        if isinstance(dump, GenericMemoryImage):
+            image = dump
+        else:
+            image = toImage(node)
+            image.read(open(dump, 'rb') if isinstance(dump, str) else dump)
         #print >>open('a', 'wb'), str(image)
         reference = toImage(node)
         if not hasattr(reference, 'read_testvector'):
@@ -218,7 +440,32 @@ class TDFCore(object):
         else:
             reference.read_testvector(open(pattern, 'rb') if isinstance(pattern, str) else pattern)
         #print >>open('b', 'wb'), str(reference)
-        image.compare(reference, offset, size, outfile)
+        return image.compare(reference, offset, size, outfile)
+
+    def align(self, device, item, dump, pattern, size=TDF.ORBIT_LENGTH, limit=10, outfile=sys.stdout):
+        """Scan all BX offsets of memory *dump* against reference *pattern*
+        (test vector or dump), returns list of offset scores ranked by
+        mismatches. The best *limit* offsets are written to *outfile* unless
+        it is None.
+        """
+        DEBUG_API(inspect.currentframe())
+        node = self._getNode(device, item)
+        image = toImage(node)
+        image.read(open(dump, 'rb') if isinstance(dump, str) else dump)
+        reference = toImage(node)
+        if not hasattr(reference, 'read_testvector'):
+            reference.read(open(pattern, 'rb') if isinstance(pattern, str) else pattern)
+        else:
+            reference.read_testvector(open(pattern, 'rb') if isinstance(pattern, str) else pattern)
+        if not hasattr(image, 'scanOffsets'):
+            raise RuntimeError("memory image {0} does not support offset scan".format(image.__class__.__name__))
+        scores = image.scanOffsets(reference, size, limit)
+        if outfile is not None:
+            for score in scores:
+                types = ' '.join(["{0}={1}".format(key, value) for key, value in sorted(score.types.items())])
+                outfile.write("offset {score.offset:>4}: {score.mismatches:>4} mismatches ({types})\n".format(**locals()))
+            outfile.flush()
+        return scores
 
     def wait(self, device, item, value=0, timeout=10.0, interval=0.25):
         """Wait for item until it contains requested *value* or fail after
@@ -232,12 +479,23 @@ class TDFCore(object):
                 raise RuntimeError("Timeout waiting for `{item}' to be `0x{value:0x}' on device `{device}'.".format(**locals()))
             time.sleep(interval)
 
-    def buffgen(self, pattern, quads=18, frames=1024, board='MP7_GENERIC', outfile=sys.stdout):
+    def buffgen(self, pattern, quads=18, frames=1024, board='MP7_GENERIC', outfile=sys.stdout, binary=False):
+        """Generate MP7 buffer pattern from generic *pattern* (:zero, :counter)
+        or test vector file. If *binary* is True the pattern is written in
+        compact binary buffer format.
+        """
         DEBUG_API(inspect.currentframe())
         # Using MP7 tx/rx buffer generator.
+        from tdf.mp7.buffgen import Buffgen
         buffgen = Buffgen(board)
         if isinstance(outfile, str): #TODO
-            outfile = open(outfile, 'wr')
+            outfile = open(outfile, 'wb' if binary else 'wr')
+
+        # Write compact binary buffer format.
+        if binary:
+            buffgen.dumpBinary(buffgen.frames(pattern, quads, frames), outfile)
+            outfile.flush()
+            return TDF.EXIT_SUCCESS
 
         # Generate generic patterns.
         if pattern.startswith(":"):
@@ -254,6 +512,39 @@ class TDFCore(object):
             print >>outfile, buffgen.fromTestVector(pattern, quads, frames)
             return TDF.EXIT_SUCCESS
 
+    def buffinject(self, device, pattern, links=None, path='rx', quads=18, frames=1024):
+        """Write buffer *pattern* directly into the MP7 channel buffers of
+        *device*, bypassing the text file and MP7 butler round trip. Argument
+        *pattern* is a generic pattern (:zero, :counter), a binary buffer file
+        or a test vector file. Optional *links* selects links using the MP7
+        butler notation (eg. "0-15"), default are all links of *quads*.
+        Argument *path* selects the RX or TX buffers. All buffer selections
+        and writes are queued and sent in a single dispatch.
+
+        Note that the buffer modes still have to be configured, eg. by using
+        mp7butler buffers <device> loopPlay.
+        """
+        DEBUG_API(inspect.currentframe())
+        if path not in BUFFER_PATHS:
+            raise RuntimeError("no such buffer path `{path}', try `rx' or `tx' instead".format(**locals()))
+        from tdf.mp7.buffgen import Buffgen, link_list, raw_buffer
+        buffgen = Buffgen(device)
+        data = buffgen.frames(pattern, quads, frames)
+        links = range(quads * 4) if links is None else link_list(links)
+        for link in links:
+            if data and link >= len(data[0]):
+                raise RuntimeError("link {link} exceeds number of pattern links".format(**locals()))
+        hw = self.interface(device)
+        hw.getNode('datapath.ctrl.txrx_sel').write(BUFFER_PATHS[path])
+        for link in links:
+            quad, channel = divmod(link, 4)
+            hw.getNode('datapath.ctrl.quad_sel').write(quad)
+            hw.getNode('datapath.ctrl.chan_sel').write(channel)
+            hw.getNode('datapath.region.buffer.buffer.addr').write(0x0)
+            hw.getNode('datapath.region.buffer.buffer.data').writeBlock(raw_buffer(data, link))
+        hw.dispatch()
+        info("injected {0} links into {path} buffers of {device}".format(len(links), **locals()))
+
     def mp7butler(self, *args, **kwargs):
         """Execute a MP7 butler command. Optional positional argument list
         *args* is forwared to the MP7 butler call. Take note that the following
@@ -322,6 +613,7 @@ class TDFCore(object):
         Note the naming notation for device IDs *<module>.<slot>*
         """
         DEBUG_API(inspect.currentframe())
+        from tdf.core.scripts import ScriptRunner
         return ScriptRunner(self).run_unittest(device, test)
 
     def run(self, routine, *args):
@@ -333,4 +625,5 @@ class TDFCore(object):
         """
         DEBUG_API(inspect.currentframe())
         # ...create a temporary run environemnt/area, then move to
+        from tdf.core.scripts import ScriptRunner
         return ScriptRunner(self).run_routine(routine, *args)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2013-2017 Bernhard Arnold <bernahrd.arnold@cern.ch>
+#
+
+"""Counter anomaly detectors.
+
+Detectors are fed incrementally with one row of counters (eg. the 512 algorithm
+rate counters) per luminosity segment, rows of a segments x counters history
+(see tdf.core.monitor.CounterRing) can be replayed. State is kept per counter
+(number of segments holding the same value), so an update costs a single pass
+over the row. Whole rows are compared first, single
+counters are only inspected if rows differ.
+
+Detectors return lists of Alert records.
+
+Example
+-------
+
+    >>> detector = StuckDetector(segments=3, threshold=10)
+    >>> for segment, counters in history:
+    ...     for alert in detector.update('gt_mp7.1', segment, counters):
+    ...         print alert.message
+
+"""
+
+from collections import namedtuple
+from array import array
+import time
+
+__all__ = [ 'Alert', 'MismatchDetector', 'StuckDetector', '__doc__', ]
+
+class Alert(namedtuple('Alert', 'timestamp, device, segment, kind, indices, message')):
+    """Monitoring alert of *kind* raised for counter *indices* of *device* in
+    luminosity *segment*."""
+
+    def asdict(self):
+        """Returns alert as dictionary (eg. for JSON serialization)."""
+        return dict(self._asdict())
+
+class Detector(object):
+    """Base class for counter detectors."""
+
+    kind = None
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Reset detector state."""
+        self.count = 0
+
+    def alert(self, device, segment, indices, message):
+        """Returns list containing an alert for *indices*."""
+        return [Alert(time.time(), device, segment, self.kind, indices, message)]
+
+    def replay(self, device, ring):
+        """Feed all rows of counter history *ring*, returns list of alerts."""
+        alerts = []
+        for segment, timestamp, values in ring.rows():
+            alerts.extend(self.update(device, segment, values))
+        return alerts
+
+class MismatchDetector(Detector):
+    """Detects counters differing between two counter rows (eg. algorithm rates
+    before and after prescaler with prescale factors of 1)."""
+
+    kind = 'mismatch'
+
+    def update(self, device, segment, before, after):
+        """Returns list of alerts for differing counters of *before* and
+        *after*."""
+        self.count += 1
+        if before == after:
+            return []
+        indices = [index for index in range(len(before)) if before[index] != after[index]]
+        return self.alert(device, segment, indices, "before/after prescaler counters not equal for algorithms {indices}".format(**locals()))
+
+    def replayPair(self, device, before, after):
+        """Feed all rows of counter histories *before* and *after*, returns
+        list of alerts."""
+        alerts = []
+        for (segment, _, a), (_, _, b) in zip(before.rows(), after.rows()):
+            alerts.extend(self.update(device, segment, a, b))
+        return alerts
+
+class StuckDetector(Detector):
+    """Detects counters holding the same value, at least *threshold*, over
+    *segments* consecutive luminosity segments. The number of segments every
+    counter held its value is updated incrementally."""
+
+    kind = 'stuck'
+
+    def __init__(self, segments=3, threshold=10):
+        self.segments = segments
+        self.threshold = threshold
+        super(StuckDetector, self).__init__()
+
+    def reset(self):
+        super(StuckDetector, self).reset()
+        self.previous = None
+        self.runs = None
+
+    def stuck(self):
+        """Returns list of indices of currently stuck counters."""
+        if self.previous is None:
+            return []
+        previous, runs = self.previous, self.runs
+        return [index for index in range(len(runs)) if runs[index] >= self.segments and previous[index] >= self.threshold]
+
+    def update(self, device, segment, values):
+        """Returns list of alerts for stuck counters of row *values*."""
+        self.count += 1
+        previous = self.previous
+        if previous is None or len(previous) != len(values):
+            self.runs = array('I', [1]) * len(values)
+        elif previous == values:
+            self.runs = array('I', [run + 1 for run in self.runs])
+        else:
+            runs = self.runs
+            self.runs = array('I', [runs[index] + 1 if previous[index] == value else 1 for index, value in enumerate(values)])
+        self.previous = values
+        indices = self.stuck()
+        if not indices:
+            return []
+        return self.alert(device, segment, indices, "potential stuck counters {indices} over past {self.segments} lumi segments".format(**locals()))
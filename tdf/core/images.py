@@ -6,15 +6,32 @@
 
 """This module provides memory image classes."""
 
+from array import array
+import time
 import sys
 
 from filereader import FileReader
 from testvector import TestVector
 from settings import TDF
 import binutils
+import columnar
+import alignment
 import random
 
-__all__ = [ 'GenericMemoryImage', 'ColumnMemoryImage', '__doc__', ]
+__all__ = [ 'GenericMemoryImage', 'ColumnMemoryImage', 'dword_arrays', '__doc__', ]
+
+def dword_arrays(name, values, dwords=1):
+    """Returns list of (name, array) tuples holding *values* as 32 bit arrays.
+    Values wider than 32 bit are split into *dwords* arrays named
+    <name>_<n>, starting with the least significant DWORD.
+    >>> dword_arrays('extcond', [0x100000002], 2)
+    [('extcond_0', array('I', [2L])), ('extcond_1', array('I', [1L]))]
+    """
+    if dwords == 1:
+        return [(name, array('I', values))]
+    mask = binutils.bitmask(TDF.DATA_WIDTH)
+    return [('{0}_{1}'.format(name, i), array('I', [(value >> (i * TDF.DATA_WIDTH)) & mask for value in values]))
+        for i in range(dwords)]
 
 class GenericMemoryImage(object):
     """Abstract 32bit uHAL memory image provides data manipulation as well as
@@ -171,10 +188,63 @@ class ColumnMemoryImage(GenericMemoryImage):
                 offset = (column + ii) * self.blocksize + i
                 self._data[offset] = value
 
+    def merge(self, images):
+        """Merge data of memory *images* into this image by bitwise OR of the
+        packed DWORD columns, eg. to combine algorithms or FINORs of multiple
+        modules. Returns the image itself.
+
+        >>> merged = AlgorithmMemoryImage().merge([dump_a, dump_b])
+        """
+        data = self._data
+        for image in images:
+            assert isinstance(image, self.__class__) and image.size == self.size, "can only merge memory images of same type"
+            data = [a | b for a, b in zip(data, image.data)]
+        self._data = data
+        return self
+
     def merged(self):
         """Return rows merged over all columns. Provided for convenience."""
         return self.extract(0, self.columns)
 
+    def objectColumns(self):
+        """Returns list of tuples (key, specification, columns), *columns* is
+        a list of per object value columns. By default the merged values."""
+        return [('data', None, [self.merged()[:TDF.ORBIT_LENGTH]])]
+
+    def scanOffsets(self, image, size=TDF.ORBIT_LENGTH, limit=None):
+        """Evaluate every BX offset of this image against reference *image*
+        in a single pass. Returns list of alignment.OffsetScore (offset,
+        mismatching BX, mismatching BX by object type) ranked by mismatches,
+        optional *limit* returns only the best offsets. Offsets are compatible
+        with the *offset* argument of compare().
+        """
+        def sequences(image):
+            # Join all objects of a type to a single value per BX.
+            return [(key, zip(*columns) if len(columns) > 1 else columns[0])
+                for key, _, columns in image.objectColumns()]
+        return alignment.scan_offsets(sequences(self), sequences(image), size, limit)
+
+    def columnArrays(self):
+        """Returns list of (name, array) tuples used for columnar export, by
+        default the raw 32 bit columns. Subclasses provide decoded columns."""
+        arrays = []
+        for column in range(self.columns):
+            arrays.extend(dword_arrays('word_{0}'.format(column), self.extract(column)[:TDF.ORBIT_LENGTH]))
+        return arrays
+
+    def exportColumns(self, filename, device=None, item=None, uuid=None, timestamp=None):
+        """Export columns to compact columnar file *filename* (NumPy *.npz*
+        compatible, see tdf.core.columnar). Optional *device*, *item*, menu
+        *uuid* and *timestamp* (default is now) are stored as metadata."""
+        columnar.write_columns(filename, self.columnArrays(),
+            image=self.__class__.__name__,
+            device=device,
+            item=item,
+            uuid=uuid,
+            timestamp=time.time() if timestamp is None else timestamp,
+            orbit_length=TDF.ORBIT_LENGTH,
+        )
+
     def read(self, fs):
         """Basic file reader for multiple 32 bit colums hex files."""
         reader = FileReader(fs, fields=(('values', 'x8', self.columns), ))
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2013-2017 Bernhard Arnold <bernahrd.arnold@cern.ch>
+#
+
+"""Continuous rate counter monitoring.
+
+RateMonitor polls the luminosity segment number of an uGT module and, on every
+new segment, reads the rate counters of all monitored uGT and extcond devices
+in parallel (one snapshot per device). Counters are stored in fixed size
+columnar ring buffers, one per device and counter item, holding one row of
+counters per luminosity segment. Before/after prescaler mismatches and stuck
+counters are checked on every segment (see tdf.core.detectors).
+
+The history is exported as CSV or served by a local HTTP endpoint:
+
+    /status                         latest segment by device and recent alerts (JSON)
+    /alerts                         recent alerts (JSON)
+    /history/<device>/<item>.csv    counter history (CSV)
+
+Example
+-------
+
+    >>> monitor = RateMonitor(read, snapshot, interface, ['gt_mp7.1', 'gt_mp7.2', 'extcond_amc502.9'])
+    >>> monitor.serve(8042)
+    >>> monitor.run(interval=1.)
+
+"""
+
+from tdf.core.snapshot import DWORD_TYPECODE
+from tdf.core.detectors import Alert, MismatchDetector, StuckDetector
+from tdf.core.toolbox import device_type
+from tdf.core import logger
+from collections import deque
+from array import array
+import BaseHTTPServer
+import SocketServer
+import threading
+import urllib
+import json
+
+__all__ = [ 'MONITOR_COUNTERS', 'Alert', 'CounterRing', 'RateMonitor', '__doc__', ]
+
+LUMI_SEGMENT_ITEM = 'gt_mp7_frame.rb.tcm_status.luminosity_seg_nr'
+"""Luminosity segment number register of uGT modules."""
+
+MONITOR_COUNTERS = {
+    'gt_mp7': (
+        'gt_mp7_gtlfdl.rate_cnt_before_prescaler',
+        'gt_mp7_gtlfdl.rate_cnt_after_prescaler',
+        'gt_mp7_gtlfdl.rate_cnt_post_dead_time',
+        'gt_mp7_gtlfdl.rate_cnt_l1a',
+        'gt_mp7_gtlfdl.rate_cnt_finor',
+    ),
+    'extcond_amc502': (
+        'payload.rate_cnt_extcond',
+    ),
+}
+"""Monitored counter items by device type."""
+
+BEFORE_PRESCALER = 'gt_mp7_gtlfdl.rate_cnt_before_prescaler'
+AFTER_PRESCALER = 'gt_mp7_gtlfdl.rate_cnt_after_prescaler'
+
+DEFAULT_DEPTH = 1024
+"""Default number of luminosity segments kept in history."""
+
+ALERT_HISTORY = 256
+"""Number of recent alerts kept."""
+
+class CounterRing(object):
+    """Fixed size columnar ring buffer of counter blocks, holding one row of
+    *width* counters per luminosity segment for the latest *depth* segments.
+    All rows share one flat DWORD array.
+
+    >>> ring = CounterRing(512, 1024)
+    >>> ring.append(42, timestamp, counters)
+    >>> ring.column(12) # counter 12 over all segments, oldest first
+    """
+
+    def __init__(self, width, depth=DEFAULT_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.data = array(DWORD_TYPECODE, [0]) * (width * depth)
+        self.segments = array('l', [0]) * depth
+        self.timestamps = array('d', [0.]) * depth
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.depth)
+
+    def append(self, segment, timestamp, values):
+        """Append row of counter *values* (DWORD array) of luminosity *segment*,
+        overwrites the oldest row if full."""
+        if len(values) != self.width:
+            raise ValueError("expected {0} counters, got {1}".format(self.width, len(values)))
+        slot = self.count % self.depth
+        self.data[slot * self.width:(slot + 1) * self.width] = values
+        self.segments[slot] = segment
+        self.timestamps[slot] = timestamp
+        self.count += 1
+
+    def slots(self):
+        """Returns list of ring slots, oldest first."""
+        return [n % self.depth for n in range(self.count - len(self), self.count)]
+
+    def row(self, n=-1):
+        """Returns counter array of *n*-th row (oldest first, negative indices
+        count from latest)."""
+        slot = self.slots()[n]
+        return self.data[slot * self.width:(slot + 1) * self.width]
+
+    def rows(self):
+        """Returns list of (segment, timestamp, counters) tuples, oldest first."""
+        return [(self.segments[slot], self.timestamps[slot], self.data[slot * self.width:(slot + 1) * self.width]) for slot in self.slots()]
+
+    def column(self, index):
+        """Returns list of counter *index* over all segments, oldest first."""
+        return [self.data[slot * self.width + index] for slot in self.slots()]
+
+    def writeCsv(self, fp):
+        """Write history to file *fp* in CSV format, one row per segment."""
+        fp.write(','.join(['lumi_segment', 'timestamp'] + [str(index) for index in range(self.width)]))
+        fp.write('\n')
+        for segment, timestamp, values in self.rows():
+            fp.write(','.join([str(segment), '{0:.3f}'.format(timestamp)] + [str(value) for value in values]))
+            fp.write('\n')
+
+class RateMonitor(object):
+    """Polls rate counters of *devices* once per luminosity segment using the
+    core API functions *read*, *snapshot* and *interface* (hardware interfaces
+    are resolved once in the calling thread). The luminosity segment number is
+    read from the first uGT device. Stuck counter checks are run over the last
+    *stucked_segments* segments for counters of at least *stucked_threshold*.
+    """
+
+    def __init__(self, read, snapshot, interface, devices, depth=DEFAULT_DEPTH, stucked_segments=3, stucked_threshold=10):
+        self.read = read
+        self.snapshot = snapshot
+        self.devices = list(devices)
+        for device in self.devices:
+            if device_type(device) not in MONITOR_COUNTERS:
+                raise ValueError("unsupported device type: {device}".format(**locals()))
+        self.interfaces = dict([(device, interface(device)) for device in self.devices])
+        lumi_devices = [device for device in self.devices if device_type(device) == 'gt_mp7']
+        if not lumi_devices:
+            raise ValueError("at least one uGT device (gt_mp7) is required")
+        self.lumi_device = lumi_devices[0]
+        self.depth = depth
+        self.stucked_segments = stucked_segments
+        self.stucked_threshold = stucked_threshold
+        self.rings = {}
+        self.alerts = deque(maxlen=ALERT_HISTORY)
+        self._detectors = {}
+        self.segment = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def ring(self, device, item):
+        """Returns counter ring buffer of *device* and *item* or None."""
+        return self.rings.get((device, item))
+
+    def poll(self):
+        """Read current luminosity segment number, records counters of the
+        completed segment on change. Returns True if counters were recorded."""
+        segment = self.read(self.lumi_device, LUMI_SEGMENT_ITEM)
+        previous, self.segment = self.segment, segment
+        if previous is None or previous == segment:
+            return False
+        self.record(previous)
+        return True
+
+    def record(self, segment):
+        """Read counters of all devices in parallel and store them for
+        luminosity *segment*."""
+        snapshots = {}
+        errors = []
+        def worker(device):
+            try:
+                snapshots[device] = self.snapshot(device, MONITOR_COUNTERS[device_type(device)], hw=self.interfaces[device])
+            except Exception, e:
+                errors.append((device, e))
+        threads = [threading.Thread(target=worker, args=(device, )) for device in self.devices]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for device, e in errors:
+            logger.error("failed to read counters from {device}: {e}".format(**locals()))
+        with self.lock:
+            for device, snapshot in sorted(snapshots.items()):
+                for item, values in zip(snapshot.items, snapshot.values):
+                    key = (device, item)
+                    if key not in self.rings:
+                        self.rings[key] = CounterRing(len(values), self.depth)
+                    self.rings[key].append(segment, snapshot.timestamp, values)
+                self.check(device, segment)
+
+    def detectors(self, device):
+        """Returns tuple of mismatch and stuck counter detectors of *device*."""
+        if device not in self._detectors:
+            self._detectors[device] = (MismatchDetector(), StuckDetector(self.stucked_segments, self.stucked_threshold))
+        return self._detectors[device]
+
+    def check(self, device, segment):
+        """Run mismatch and stuck counter checks for *device*, alerts are
+        logged and kept in *alerts*."""
+        before = self.ring(device, BEFORE_PRESCALER)
+        after = self.ring(device, AFTER_PRESCALER)
+        if not before or not after:
+            return
+        mismatches, stuck = self.detectors(device)
+        alerts = mismatches.update(device, segment, before.row(), after.row())
+        alerts += stuck.update(device, segment, after.row())
+        for alert in alerts:
+            self.alerts.append(alert)
+            logger.warning("{alert.device}: LS {alert.segment}: {alert.message}".format(**locals()))
+
+    def status(self):
+        """Returns dictionary of monitoring status."""
+        with self.lock:
+            devices = {}
+            for (device, item), ring in self.rings.items():
+                if len(ring):
+                    latest = devices.setdefault(device, {})
+                    latest[item] = list(ring.row())
+                    latest['lumi_segment'] = ring.segments[ring.slots()[-1]]
+            return dict(
+                lumi_segment=self.segment,
+                devices=devices,
+                alerts=[alert.asdict() for alert in self.alerts],
+            )
+
+    def writeCsv(self, device, item, fp):
+        """Write counter history of *device* and *item* in CSV format."""
+        with self.lock:
+            ring = self.ring(device, item)
+            if ring is None:
+                raise KeyError("no history for {device}:{item}".format(**locals()))
+            ring.writeCsv(fp)
+
+    def run(self, interval=1.):
+        """Poll every *interval* seconds until stop() is called, read errors
+        are logged and polling continues."""
+        self.stopped.clear()
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except Exception, e:
+                logger.error("rate monitor: {e}, retrying...".format(**locals()))
+            self.stopped.wait(interval)
+
+    def stop(self):
+        """Stop polling."""
+        self.stopped.set()
+
+    def serve(self, port, host='localhost'):
+        """Serve monitoring status and history by HTTP in a background
+        thread, returns the server."""
+        server = MonitorServer((host, port), MonitorRequestHandler)
+        server.monitor = self
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        logger.info("rate monitor serving on http://{host}:{port}/".format(**locals()))
+        return server
+
+class MonitorServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class MonitorRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves monitoring status (JSON) and counter history (CSV)."""
+
+    def do_GET(self):
+        monitor = self.server.monitor
+        path = [urllib.unquote(token) for token in self.path.split('?')[0].strip('/').split('/')]
+        if path == ['status']:
+            self.reply('application/json', json.dumps(monitor.status()))
+        elif path == ['alerts']:
+            self.reply('application/json', json.dumps([alert.asdict() for alert in list(monitor.alerts)]))
+        elif len(path) == 3 and path[0] == 'history' and path[2].endswith('.csv'):
+            device, item = path[1], path[2][:-len('.csv')]
+            if monitor.ring(device, item) is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv')
+            self.end_headers()
+            monitor.writeCsv(device, item, self.wfile)
+        else:
+            self.send_error(404)
+
+    def reply(self, content_type, data):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("rate monitor: " + format % args)
@@ -32,17 +32,24 @@ class ScriptRunner(BaseScriptRunner):
         self.core_api = {
             'read': api.read,
             'write': api.write,
+            'multiread': api.multiread,
+            'interface': api.interface,
             'blockread': api.blockread,
             'blockwrite': api.blockwrite,
+            'upload': api.upload,
+            'snapshot': api.snapshot,
+            'snapshots': api.snapshots,
             'configure': api.configure,
             'dump': api.dump,
             'load': api.load,
             'clear': api.clear,
             'wait': api.wait,
             'compare': api.compare,
+            'align': api.align,
             'mp7butler': api.mp7butler,
             'amc502butler': api.amc502butler,
             'buffgen': api.buffgen,
+            'buffinject': api.buffinject,
             'TDF_INFO': logger.info,
             'TDF_NOTICE': logger.notice,
             'TDF_WARNING': logger.warning,
@@ -17,8 +17,11 @@ Example
 """
 
 import os
+import hashlib
+from array import array
+import tempfile
+import cPickle as pickle
 from tdf.core.toolbox import to_namedtuple
-from tdf.extern import yaml
 from tdf.core import binutils
 from tdf import __version__ as TDF_VERSION
 
@@ -34,13 +37,101 @@ def getpath(name, default=None):
     value = os.getenv(name, default)
     return value and os.path.abspath(value)
 
+# Compiled settings cache format version, increment on incompatible changes.
+SETTINGS_CACHE_VERSION = 1
+
+_settings_cache = {}
+"""In-process cache of loaded YAML files, shared by all readers."""
+
+def yaml_loader():
+    """Returns the fastest available YAML loader class, the LibYAML based C
+    loader if available, else the pure Python implementation."""
+    from tdf.extern import yaml
+    if yaml.__with_libyaml__:
+        return yaml.CLoader
+    return yaml.Loader
+
+def settings_cache_filename(filename):
+    """Returns compiled cache filename for YAML settings *filename*."""
+    key = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+    return os.path.join(TDFCoreSettings.CACHE_DIR, 'settings-{0}.pickle'.format(key))
+
+def read_settings_cache(filename, mtime, digest):
+    """Returns cached data of YAML file or None if the cache is missing or
+    outdated (mtime and SHA1 digest of the source file must match)."""
+    try:
+        with open(settings_cache_filename(filename), 'rb') as fp:
+            version, cached_mtime, cached_digest, data = pickle.load(fp)
+    except (IOError, OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        return None
+    if (version, cached_mtime, cached_digest) != (SETTINGS_CACHE_VERSION, mtime, digest):
+        return None
+    return data
+
+def write_settings_cache(filename, mtime, digest, data):
+    """Write compiled cache of YAML file, silently ignores write errors (eg.
+    read-only home directories)."""
+    cachefile = settings_cache_filename(filename)
+    try:
+        dirname = os.path.dirname(cachefile)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # Write to temporary file and rename for concurrent processes.
+        fd, tmpname = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump((SETTINGS_CACHE_VERSION, mtime, digest, data), fp, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmpname, cachefile)
+    except (IOError, OSError, pickle.PicklingError):
+        pass
+
+def load_yaml(filename):
+    """Load YAML file using a compiled cache. The file is parsed only if its
+    modification time or content changed since the cache was written, the
+    result is shared within the process. Returns `None' for empty files.
+
+    >>> data = load_yaml(os.path.join(TDF.SETTINGS_DIR, 'objects.yml'))
+    """
+    filename = os.path.abspath(filename)
+    with open(filename, 'rb') as fp:
+        mtime = os.fstat(fp.fileno()).st_mtime
+        content = fp.read()
+    digest = hashlib.sha1(content).hexdigest()
+    key = (filename, mtime, digest)
+    if key not in _settings_cache:
+        data = read_settings_cache(filename, mtime, digest)
+        if data is None:
+            from tdf.extern import yaml
+            data = yaml.load(content, Loader=yaml_loader())
+            write_settings_cache(filename, mtime, digest, data)
+        _settings_cache[key] = data
+    return _settings_cache[key]
+
 def read_settings(filename):
     """Read YAML settings to named tuple tree."""
-    with open(filename) as fp:
-        data = yaml.load(fp.read())
-    return to_namedtuple(
-        yaml.load(open(os.path.join(TDFCoreSettings.SETTINGS_DIR, 'objects.yml')).read())
-    )
+    return to_namedtuple(load_yaml(filename))
+
+class lazy_setting(object):
+    """Class attribute decorator, the setting is evaluated on first access and
+    replaces the descriptor. Used to defer reading of settings files until
+    required.
+
+    >>> class Settings:
+    ...     @lazy_setting
+    ...     def ANSWER(cls):
+    ...         return 42
+    >>> Settings.ANSWER
+    42
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.name = loader.__name__
+        self.__doc__ = loader.__doc__
+
+    def __get__(self, instance, owner):
+        value = self.loader(owner)
+        setattr(owner, self.name, value)
+        return value
 
 class DataSpecification(object):
     """Container class for object and algorithm data specifications.
@@ -55,6 +146,20 @@ class DataSpecification(object):
         self._dwords = binutils.requires(width, UHAL_DATA_WIDTH)
         self._charcount = binutils.charcount(width)
         self._bitmask = binutils.bitmask(width)
+        self._slices = self._compile(coding)
+
+    @staticmethod
+    def _compile(coding):
+        """Returns precompiled slice table of tuples (name, shift, mask) from
+        bit slice mapping (named tuple or dictionary)."""
+        if not coding:
+            return ()
+        items = coding._asdict().items() if hasattr(coding, '_asdict') else coding.items()
+        slices = []
+        for name, bs in items:
+            msb, lsb = (bs.msb, bs.lsb) if hasattr(bs, 'msb') else (bs['msb'], bs['lsb'])
+            slices.append((name, lsb, binutils.bitmask(msb - lsb + 1)))
+        return tuple(slices)
 
     @property
     def count(self):
@@ -81,6 +186,11 @@ class DataSpecification(object):
         """Returns number of hex charachters required to express data."""
         return self._charcount
 
+    @property
+    def fields(self):
+        """Returns list of field names defined by bit slice mapping."""
+        return [name for name, _, _ in self._slices]
+
     def binstr(self, value):
         """Returns binary formatted string of attribute *value* with leading
         zeros according to data width."""
@@ -94,10 +204,21 @@ class DataSpecification(object):
     def decode(self, value):
         """Decode object value according to given bit slice mapping."""
         assert isinstance(value, int) or isinstance(value, long)
-        if not self._coding:
-            return {}
-        data = dict([(k, (v.msb, v.lsb)) for k, v in self._coding._asdict().items()])
-        return binutils.bitdecode(value, data)
+        return dict([(name, (value >> shift) & mask) for name, shift, mask in self._slices])
+
+    def decodeColumn(self, values):
+        """Decode a column of object values (eg. one object for all BX),
+        returns dictionary of per field arrays.
+
+        >>> TDF.EG.decodeColumn([0x1234, 0x5678])['et']
+        array('L', [52L, 120L])
+        """
+        columns = {}
+        for name, shift, mask in self._slices:
+            column = [(value >> shift) & mask for value in values]
+            # Note: fields wider than 32 bit are kept as list.
+            columns[name] = array('L', column) if mask <= 0xffffffff else column
+        return columns
 
 class TDFCoreSettings:
     """Constants for TDF software."""
@@ -137,6 +258,11 @@ class TDFCoreSettings:
     UNITTEST_DIR = os.path.join(ROOT_DIR, 'etc', 'unittest')
     """Absolute path to TDF etc/unittest directory."""
 
+    CACHE_DIR = getpath('TDF_CACHE_DIR', os.path.join(HOME_DIR, '.cache', 'tdf'))
+    """Absolute path to directory for compiled settings. If environment variable
+    *TDF_CACHE_DIR* is not set it uses *~/.cache/tdf*.
+    """
+
     L1MENU_DIR = getpath('TDF_L1MENU_DIR')
     """Absolute path to L1 menu directory. If environment variable
     *TDF_L1MENU_DIR* is not set it returns *None*."""
@@ -161,8 +287,10 @@ class TDFCoreSettings:
 class TDFSettings(TDFCoreSettings):
     """Constants for TDF software."""
 
-    # Ugly
-    OBJECTS = read_settings(os.path.join(TDFCoreSettings.SETTINGS_DIR, 'objects.yml'))
+    @lazy_setting
+    def OBJECTS(cls):
+        """Object settings read from objects.yml on first access."""
+        return read_settings(os.path.join(cls.SETTINGS_DIR, 'objects.yml'))
 
     ORBIT_LENGTH = 3564
     """LHC orbit length in bunch crossings."""
@@ -173,35 +301,55 @@ class TDFSettings(TDFCoreSettings):
     ORBIT_SEC = ORBIT_LENGTH * BX_SEC
     """Orbit time in seconds."""
 
-    MUON = DataSpecification(**OBJECTS.muon._asdict())
-    """Muon object specification."""
-
-    EG = DataSpecification(**OBJECTS.eg._asdict())
-    """e/gamma object specification."""
-
-    TAU = DataSpecification(**OBJECTS.tau._asdict())
-    """Tau object specification."""
-
-    JET = DataSpecification(**OBJECTS.jet._asdict())
-    """Jet object specification."""
-
-    ETT = DataSpecification(**OBJECTS.ett._asdict())
-    """ETT specification."""
-
-    HT = DataSpecification(**OBJECTS.ht._asdict())
-    """HT specification."""
-
-    ETM = DataSpecification(**OBJECTS.etm._asdict())
-    """ETM specification."""
-
-    HTM = DataSpecification(**OBJECTS.htm._asdict())
-    """HTM specification."""
-
-    ETMHF = DataSpecification(**OBJECTS.etmhf._asdict())
-    """ETMHF specification."""
-
-    HTMHF = DataSpecification(**OBJECTS.htmhf._asdict())
-    """ETMHF specification."""
+    @lazy_setting
+    def MUON(cls):
+        """Muon object specification."""
+        return DataSpecification(**cls.OBJECTS.muon._asdict())
+
+    @lazy_setting
+    def EG(cls):
+        """e/gamma object specification."""
+        return DataSpecification(**cls.OBJECTS.eg._asdict())
+
+    @lazy_setting
+    def TAU(cls):
+        """Tau object specification."""
+        return DataSpecification(**cls.OBJECTS.tau._asdict())
+
+    @lazy_setting
+    def JET(cls):
+        """Jet object specification."""
+        return DataSpecification(**cls.OBJECTS.jet._asdict())
+
+    @lazy_setting
+    def ETT(cls):
+        """ETT specification."""
+        return DataSpecification(**cls.OBJECTS.ett._asdict())
+
+    @lazy_setting
+    def HT(cls):
+        """HT specification."""
+        return DataSpecification(**cls.OBJECTS.ht._asdict())
+
+    @lazy_setting
+    def ETM(cls):
+        """ETM specification."""
+        return DataSpecification(**cls.OBJECTS.etm._asdict())
+
+    @lazy_setting
+    def HTM(cls):
+        """HTM specification."""
+        return DataSpecification(**cls.OBJECTS.htm._asdict())
+
+    @lazy_setting
+    def ETMHF(cls):
+        """ETMHF specification."""
+        return DataSpecification(**cls.OBJECTS.etmhf._asdict())
+
+    @lazy_setting
+    def HTMHF(cls):
+        """HTMHF specification."""
+        return DataSpecification(**cls.OBJECTS.htmhf._asdict())
 
     LINK_11_FR_0 = DataSpecification(1, 32)
     LINK_11_FR_1 = DataSpecification(1, 32)
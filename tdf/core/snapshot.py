@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2013-2017 Bernhard Arnold <bernahrd.arnold@cern.ch>
+#
+
+"""Register and counter snapshots.
+
+A snapshot holds the values of a declared set of registers and counter blocks
+of a device, all read within a single dispatch (see TDFCore.snapshot). Recent
+snapshots are kept in a bounded ring buffer per device.
+
+Example
+-------
+
+    >>> snapshot = snapshot('gt_mp7.1', LUMI_COUNTERS)
+    >>> snapshot.value('gt_mp7_frame.rb.tcm_status.luminosity_seg_nr')
+    42
+    >>> snapshot.block('gt_mp7_gtlfdl.rate_cnt_before_prescaler')[12]
+    1024
+    >>> snapshots('gt_mp7.1').series('gt_mp7_gtlfdl.rate_cnt_l1a')
+    [1000, 1002, 998]
+
+"""
+
+from collections import namedtuple, deque
+from array import array
+
+__all__ = [ 'LUMI_COUNTERS', 'Snapshot', 'SnapshotHistory', '__doc__', ]
+
+DWORD_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+SNAPSHOT_HISTORY = 64
+"""Default number of snapshots kept by device."""
+
+LUMI_COUNTERS = (
+    'gt_mp7_frame.rb.tcm_status.luminosity_seg_nr',
+    'gt_mp7_gtlfdl.rate_cnt_before_prescaler',
+    'gt_mp7_gtlfdl.rate_cnt_after_prescaler',
+    'gt_mp7_gtlfdl.rate_cnt_post_dead_time',
+    'gt_mp7_gtlfdl.rate_cnt_l1a',
+)
+"""Luminosity segment number and algorithm rate counters of uGT modules."""
+
+class Snapshot(namedtuple('Snapshot', 'device, timestamp, items, values')):
+    """Snapshot of *items* read from *device* at *timestamp*, *values* is a
+    tuple of DWORD arrays by item (single registers are arrays of length one).
+    Snapshots are shared by the history, do not modify the arrays in place."""
+
+    def block(self, item):
+        """Returns array of values of *item*."""
+        try:
+            return self.values[self.items.index(item)]
+        except ValueError:
+            raise KeyError("no such item in snapshot: {item}".format(**locals()))
+
+    def value(self, item, index=0):
+        """Returns value of register *item* (or word *index* of block)."""
+        return self.block(item)[index]
+
+    def asdict(self):
+        """Returns dictionary of value arrays by item."""
+        return dict(zip(self.items, self.values))
+
+class SnapshotHistory(deque):
+    """Bounded ring buffer of recent snapshots of a device, oldest snapshots
+    are discarded."""
+
+    def __init__(self, maxlen=SNAPSHOT_HISTORY):
+        super(SnapshotHistory, self).__init__((), maxlen)
+
+    def latest(self):
+        """Returns most recent snapshot or None if empty."""
+        return self[-1] if self else None
+
+    def series(self, item, index=0):
+        """Returns list of values of *item* (word *index*) over history,
+        oldest first."""
+        return [snapshot.value(item, index) for snapshot in self]
@@ -65,12 +65,21 @@ To mask a range of algorithms required at usign multiple modules.
 
 import sys
 from filereader import FileReader
-from binutils import charcount, bitsplit, bitjoin
+from binutils import charcount, bitsplit, bitjoin, bitcounts, BitPlanes
 from settings import TDF
 
-__all__ = [ 'TestVector', 'TestVectorReader', '__doc__', ]
+__all__ = [ 'AlgorithmCountsMixin', 'TestVector', 'TestVectorReader', '__doc__', ]
 
-class TestVector(object):
+class AlgorithmCountsMixin(object):
+    """Provides algorithm trigger counts for classes implementing method
+    *algorithms()* (list of algorithm bits by BX)."""
+
+    def algorithmCounts(self, begin=0, end=None):
+        """Returns list of trigger counts for all algorithms over the BX range
+        *begin* to *end* (slice notation)."""
+        return bitcounts(self.algorithms()[begin:end], TDF.ALGORITHM.width)
+
+class TestVector(AlgorithmCountsMixin):
     """
     Supported header informations are *name*, *description*, *datetime* (ISO
     timestamp), *events* (integer), *menu_name*, *menu_uuid (UUID4 format).
@@ -113,6 +122,7 @@ class TestVector(object):
         self._link_11_fr_5 = []
         self._extcond = []
         self._algorithms = []
+        self._algorithm_planes = None
         self._finor = []
 
     def read(self, fp):
@@ -185,6 +195,9 @@ class TestVector(object):
         mask = bitjoin([1 if index in mask else 0 for index in range(TDF.ALGORITHM.width)], 1)
         for bx in range(len(self)):
             self._algorithms[bx] &= mask
+        # Keep the bit-plane view in sync.
+        if self._algorithm_planes is not None:
+            self._algorithm_planes.mask(mask)
         # Update the FinOR
         self.updateFinor()
 
@@ -262,6 +275,16 @@ class TestVector(object):
     def algorithms(self):
         return self._algorithms
 
+    def algorithmPlanes(self):
+        """Returns bit-plane view of algorithms (one bitset of BX per
+        algorithm), built on first use.
+
+        >>> tv.algorithmPlanes().indices(42) # BX algorithm 42 fired
+        """
+        if self._algorithm_planes is None:
+            self._algorithm_planes = BitPlanes(self._algorithms, TDF.ALGORITHM.width)
+        return self._algorithm_planes
+
     def finor(self):
         return self._finor
 
@@ -539,7 +562,7 @@ class SimSpyDumpReader(FileReader):
     def __init__(self, fp):
         super(SimSpyDumpReader, self).__init__(fp, fields=self.FIELDS)
 
-class AlgorithmDump(object):
+class AlgorithmDump(AlgorithmCountsMixin):
     """
     """
 
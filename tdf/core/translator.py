@@ -14,7 +14,7 @@ defined in the uHAL address table using an item's 'type' parameter.
 
 from tdf.core import TDF
 from tdf.core import binutils
-from tdf.extern import yaml
+from tdf.core.settings import load_yaml
 import datetime
 import os
 
@@ -53,8 +53,9 @@ class BaseItemTranslator(BaseTranslator):
     def __init__(self):
         self.enumerations = {}
         if os.path.isfile(ENUMS_FILENAME):
-            # Note: take care, yaml.load() returns `None' if opened file/string is empty!
-            self.enumerations = yaml.load(open(self.enumerations_filename).read()) or {}
+            # Note: take care, load_yaml() returns `None' if opened file is empty!
+            # Parsed enumerations are shared by all translator instances.
+            self.enumerations = load_yaml(self.enumerations_filename) or {}
 
     def translate(self, node, values):
         """Translate by *node* type. Define methods named tr_<type> to extend
@@ -7,6 +7,9 @@
 """
 
 from tdf.core.binutils import bitmask, charcount
+from array import array
+import binascii
+import mmap
 import re, sys
 
 TTY_WIDTH = 128
@@ -15,6 +18,9 @@ TTY_HR_CHAR = '-'
 RECORD_EOL = '\n'
 RECORD_WIDTH = 64
 
+# Array type code for 64 bit record lines, None if not supported by platform.
+RECORD_TYPECODE = 'L' if array('L').itemsize * 8 >= RECORD_WIDTH else None
+
 # -----------------------------------------------------------------------------
 #  Record data class.
 # -----------------------------------------------------------------------------
@@ -89,20 +95,42 @@ class RecordItem(object):
         Optional attribute *value* is the value assigned to the item. The
         assigned value is masked by the item's bit width.
         """
-        m = self._regex_pattern.match(code)
-        if not m:
-            raise ValueError("RecordItem(): format mismatch of item descriptor: {code}".format(**locals()))
-        params = m.groupdict()
-        self.name = params['name']
-        self.index = params['index'] if params['index'] is None else int(params['index'])
-        self.lsb = int(params['lsb'])
-        self.msb = self.lsb if params['msb'] is None else int(params['msb'])
-        if not RECORD_WIDTH < self.msb <= self.lsb <= 0:
-            ValueError("RecordItem(): msb/lsb out of range: [{self.msb}:{self.lsb}]".format(**locals()))
+        self.name, self.index, self.msb, self.lsb = self.parse(code)
         # Set the item's initial value.
         self.line = line
         self.value = value
 
+    @classmethod
+    def parse(cls, code):
+        """Returns tuple (name, index, msb, lsb) parsed from item descriptor
+        *code*. Index is None for non list items.
+        """
+        m = cls._regex_pattern.match(code)
+        if not m:
+            raise ValueError("RecordItem(): format mismatch of item descriptor: {code}".format(**locals()))
+        params = m.groupdict()
+        name = params['name']
+        index = params['index'] if params['index'] is None else int(params['index'])
+        lsb = int(params['lsb'])
+        msb = lsb if params['msb'] is None else int(params['msb'])
+        if not 0 <= lsb <= msb < RECORD_WIDTH:
+            raise ValueError("RecordItem(): msb/lsb out of range: [{msb}:{lsb}]".format(**locals()))
+        return name, index, msb, lsb
+
+    @classmethod
+    def create(cls, name, index, msb, lsb, line=0, value=0):
+        """Creates an item from already parsed descriptor fields, skipping the
+        descriptor parsing. Provided for precompiled schemas.
+        """
+        item = cls.__new__(cls)
+        item.name = name
+        item.index = index
+        item.msb = msb
+        item.lsb = lsb
+        item.line = line
+        item.value = value
+        return item
+
     @property
     def bitwidth(self):
         """Returns items width in bits."""
@@ -183,29 +211,49 @@ class ItemList(list):
 # -----------------------------------------------------------------------------
 
 class RecordData(object):
-    """Iterateable record data container."""
+    """Iterateable record data container. Record lines are stored as array of
+    64 bit words providing constant time access by index.
+
+    >>> record = RecordData([0xcafe, 0xbabe])
+    >>> record.index(1)
+    47806
+    """
 
-    def __init__(self):
-        self._data = 0
-        self._lines = 0
+    def __init__(self, values=None):
+        self._data = array(RECORD_TYPECODE) if RECORD_TYPECODE else []
         self._pos = 0
+        if values is not None:
+            self.extend(values)
 
     def append(self, value):
-        self._data |= (value & bitmask(RECORD_WIDTH)) << (self.lines * RECORD_WIDTH)
-        self._lines += 1
+        self._data.append(value & bitmask(RECORD_WIDTH))
+
+    def extend(self, values):
+        """Append multiple record lines at once."""
+        if isinstance(values, array) and values.typecode == RECORD_TYPECODE:
+            self._data.extend(values)
+            return
+        mask = bitmask(RECORD_WIDTH)
+        self._data.extend(value & mask for value in values)
 
     def index(self, i):
         """Return value of record line with offset *i* (0..n). Raises an
         IndexError if *i* is out of bounds (*i* >= number of lines).
         """
-        if i < self.lines:
-            return (self._data >> (i * RECORD_WIDTH)) & bitmask(RECORD_WIDTH)
+        if 0 <= i < self.lines:
+            return int(self._data[i])
         raise IndexError("index(): record index out of range: {i}".format(**locals()))
 
+    def slice(self, begin, end):
+        """Return list of values of record lines from offset *begin* up to
+        *end* (exclusive).
+        """
+        return [int(value) for value in self._data[begin:end]]
+
     @property
     def lines(self):
         """Returns the record size in lines."""
-        return self._lines
+        return len(self._data)
 
     @property
     def pos(self):
@@ -238,9 +286,10 @@ class RecordData(object):
         """Returns formatted string representation to be used as row of a record
         report listing (showing line, name, hex value, dec value).
         """
+        chars = charcount(RECORD_WIDTH)
         return RECORD_EOL.join([
-            "0x{offset:04x} {value:0{chars}x}".format(offset=i, value=self.index(i), chars=charcount(RECORD_WIDTH))
-            for i in range(self.lines)])
+            "0x{offset:04x} {value:0{chars}x}".format(offset=i, value=value, chars=chars)
+            for i, value in enumerate(self._data)])
 
 # -----------------------------------------------------------------------------
 #  Record file reader class.
@@ -255,12 +304,153 @@ class RecordFileReader(object):
     def read(self):
         record = RecordData()
         pattern = re.compile('^[0-9a-f]{{{chars}}}(?:(?:\r)?{eol})?$'.format(chars=charcount(RECORD_WIDTH), eol=RECORD_EOL))
+        values = []
         for i, line in enumerate(self._file):
             if not pattern.match(line):
                 raise ValueError("read(): format mismatch in line {lineno}".format(lineno=i + 1))
-            record.append(int(line, 16))
+            values.append(int(line, 16))
+        record.extend(values)
         return record
 
+class MappedRecordFileReader(object):
+    """Memory mapped record file reader for large record dumps. Fixed width
+    lines are validated and decoded in bulk, chunk by chunk directly from the
+    map. Multi record dumps (records separated by empty lines) can be iterated
+    lazily.
+
+    >>> reader = MappedRecordFileReader("rop_dump.txt")
+    >>> record = reader.read() # single record file
+    >>> for record in reader.records(): # multi record file
+    ...     do_something(record)
+    """
+
+    # Precompiled regular expressions for bulk validation and record separators.
+    _regex_lines = re.compile(r'(?:[0-9a-f]{{{chars}}}\n)*\Z'.format(chars=charcount(RECORD_WIDTH)))
+    _regex_line = re.compile(r'^[0-9a-f]{{{chars}}}$'.format(chars=charcount(RECORD_WIDTH)))
+    _regex_separator = re.compile(r'\n(?:\r?\n)+')
+    _regex_nonblank = re.compile(r'\S')
+
+    def __init__(self, filename, chunk_lines=4096):
+        self.filename = filename
+        self.chunk_lines = chunk_lines
+
+    def _map(self):
+        """Returns read only memory map of the file, or empty string for empty
+        files (which can not be mapped)."""
+        with open(self.filename, 'rb') as fp:
+            fp.seek(0, 2)
+            if not fp.tell():
+                return ''
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _decode(self, data, begin=0, end=None, lineno=1):
+        """Validates and decodes record lines of *data* (memory map or string)
+        from offset *begin* up to *end* (exclusive), returns record data
+        container. Lines are processed in chunks of *chunk_lines* lines, so
+        only one chunk is copied from the map at a time. Attribute *lineno* is
+        the line number of the first line, used for error messages.
+        """
+        end = len(data) if end is None else end
+        chars = charcount(RECORD_WIDTH)
+        chunk_size = self.chunk_lines * (chars + 1)
+        values = array(RECORD_TYPECODE) if RECORD_TYPECODE else []
+        pos = begin
+        while pos < end:
+            split = data.find('\n', min(pos + chunk_size, end) - 1, end)
+            split = end if split < 0 else split + 1
+            chunk = data[pos:split]
+            if '\r' in chunk:
+                chunk = chunk.replace('\r\n', '\n')
+            if not chunk.endswith('\n'):
+                chunk += '\n'
+            if not self._regex_lines.match(chunk):
+                for i, line in enumerate(chunk.split('\n')):
+                    if not self._regex_line.match(line):
+                        raise ValueError("read(): format mismatch in line {lineno}".format(lineno=lineno + i))
+            hexdata = chunk.replace('\n', '')
+            if RECORD_TYPECODE:
+                words = array(RECORD_TYPECODE)
+                words.fromstring(binascii.unhexlify(hexdata))
+                if sys.byteorder == 'little':
+                    words.byteswap()
+                values.extend(words)
+            else:
+                values.extend([int(hexdata[i:i + chars], 16) for i in range(0, len(hexdata), chars)])
+            lineno += chunk.count('\n')
+            pos = split
+        return RecordData(values)
+
+    def read(self):
+        """Reads the entire file as a single record."""
+        data = self._map()
+        try:
+            return self._decode(data)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    def records(self):
+        """Yields records of a multi record file one by one, records are
+        separated by one or more empty lines.
+        """
+        data = self._map()
+        try:
+            pos = 0
+            lineno = 1
+            for match in self._regex_separator.finditer(data):
+                end = match.start() + 1
+                if self._regex_nonblank.search(data, pos, end):
+                    record = self._decode(data, pos, end, lineno)
+                    lineno += record.lines
+                    yield record
+                else:
+                    lineno += data[pos:end].count('\n')
+                lineno += match.group().count('\n') - 1
+                pos = match.end()
+            if self._regex_nonblank.search(data, pos):
+                yield self._decode(data, pos, len(data), lineno)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+# -----------------------------------------------------------------------------
+#  Record schema class.
+# -----------------------------------------------------------------------------
+
+class RecordSchema(object):
+    """Precompiled unpacking schema for a record section. Item descriptors are
+    parsed only once on creation, the schema can be applied to any number of
+    record sections using method *RecordSection.unpack()*.
+
+    Examples
+    ========
+
+    Defines a section of two lines.
+    >>> schema = RecordSchema(
+    ...     ("bx_nr[11:0]", "event_nr[43:12]"),
+    ...     ("spam[0][3:0]", "spam[1][7:4]"),
+    ... )
+    >>> len(schema)
+    2
+    """
+
+    def __init__(self, *lines):
+        """Every positional argument is a sequence of item descriptors of a
+        record line.
+        """
+        self.fields = []
+        for line in lines:
+            fields = []
+            for code in line:
+                name, index, msb, lsb = RecordItem.parse(code)
+                fields.append((name, index, msb, lsb, bitmask(msb - lsb + 1)))
+            self.fields.append(tuple(fields))
+        self.fields = tuple(self.fields)
+
+    def __len__(self):
+        """Returns number of record lines of the schema."""
+        return len(self.fields)
+
 # -----------------------------------------------------------------------------
 #  Record section class.
 # -----------------------------------------------------------------------------
@@ -299,32 +489,70 @@ class RecordSection(object):
         self.name = name or "<unnamed>"
         self.items = []
 
+    def _add_item(self, item):
+        """Assigns an item to the section, creates or extends the attribute of
+        the item's name.
+        """
+        if item.index is None:
+            if hasattr(self, item.name):
+                raise AttributeError("unpack_line(): attribute already exists: {item.name}".format(**locals()))
+            setattr(self, item.name, item)
+        else:
+            items = getattr(self, item.name, None)
+            if not isinstance(items, ItemList):
+                items = ItemList()
+                setattr(self, item.name, items)
+            items.append(item)
+        self.items.append(item)
+
+    def _sort_items(self, names):
+        """Sort by line number and descending LSB position, also sorts item
+        lists of *names*."""
+        key = lambda item: (item.line, item.index, -item.lsb)
+        self.items.sort(key=key)
+        for name in names:
+            items = getattr(self, name)
+            if isinstance(items, ItemList):
+                items.sort(key=key)
+
     def unpack_line(self, *args):
         """Unpacks a record line."""
-        if self.unpack_pos >= self.data.lines:
-            IndexError("unpack_line(): no more line to unpack: {self.unpack_pos}".format(**locals()))
+        if self.data.eor:
+            raise IndexError("unpack_line(): no more line to unpack: {self.unpack_pos}".format(**locals()))
 
         value = self.data.next()
         self.data_raw.append(value)
 
+        names = set()
         for arg in args:
             item = RecordItem(arg, self.unpack_pos + self.pos)
-
-            if hasattr(self, item.name) and item.index is None:
-                raise AttributeError("unpack_line(): attribute already exists: {arg}".format(**locals()))
             item.value = (value >> item.lsb) & bitmask(item.bitwidth)
-            self.items.append(item)
-
-            if item.index is None:
-                setattr(self, item.name, item)
-            else:
-                setattr(self, item.name, ItemList(filter(lambda item_: item_.name == item.name, self.items)))
-
-            # Sort by line number and descending LSB position.
-            self.items.sort(key=lambda item: (item.line, item.index, -item.lsb))
+            self._add_item(item)
+            names.add(item.name)
+        self._sort_items(names)
 
         self.unpack_pos += 1
 
+    def unpack(self, schema):
+        """Unpacks all record lines of a precompiled *schema* in a single pass.
+        >>> section.unpack(RecordSchema(("spam[31:0]", ), ("eggs[15:0]", )))
+        """
+        # Same boundary as RecordData.next() (see RecordData.eor).
+        end = self.data.pos + len(schema)
+        if end >= self.data.lines:
+            raise IndexError("unpack(): schema exceeds record: line {end} of {self.data.lines}".format(**locals()))
+        create = RecordItem.create
+        names = set()
+        for fields in schema.fields:
+            value = self.data.next()
+            self.data_raw.append(value)
+            line = self.unpack_pos + self.pos
+            for name, index, msb, lsb, mask in fields:
+                self._add_item(create(name, index, msb, lsb, line, (value >> lsb) & mask))
+                names.add(name)
+            self.unpack_pos += 1
+        self._sort_items(names)
+
     def __str__(self):
         """Returns formatted string representation to be used as row of a record
         report listing (showing line, name, hex value, dec value).
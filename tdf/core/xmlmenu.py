@@ -39,7 +39,14 @@ external signals by using flags. To read only menu meta data disable parsing:
 
 """
 
+from tdf.core.settings import TDF
+import cPickle as pickle
+import tempfile
+import hashlib
+import glob
 import sys, os
+from io import BytesIO
+from collections import OrderedDict
 
 try:
     from lxml import etree
@@ -48,46 +55,186 @@ except ImportError:
 
 __all__ = [ 'XmlMenu', '__doc__' ]
 
-def filter_first(function, sequence):
-    """Retruns first match of filter() result or None if nothing was found."""
-    return list(filter(function, sequence) or [None])[0]
-
-def get_xpath(elem, path, fmt=str, default=None):
-    """Easy access using etree elem xpath method. Returns value of 'default' if
-    element was not found (default is 'None').
+# Compiled menu cache format version, increment on incompatible changes.
+MENU_CACHE_VERSION = 2
+
+# Maximum number of compiled menus (state and texts files) kept in TDF.CACHE_DIR.
+MENU_CACHE_LIMIT = 64
+
+# Maximum number of compiled menus kept in process.
+MENU_MEMORY_LIMIT = 8
+
+_menu_cache = OrderedDict()
+"""In-process cache of pickled compiled menus and in-memory texts by content
+digest and parsing options, least recently used first."""
+
+META_FIELDS = {
+    'name': (str, None),
+    'uuid_menu': (str, None),
+    'uuid_firmware': (str, None),
+    'grammar_version': (str, None),
+    'is_valid': (bool, None),
+    'is_obsolete': (bool, None),
+    'n_modules': (int, None),
+    'comment': (str, ""),
+}
+"""Menu meta data fields, value type and default."""
+
+def get_text(fields, name, fmt=str, default=None):
+    """Returns converted text of child element *name* from dictionary *fields*
+    (child text by tag). Returns value of 'default' if element was not found
+    or is empty (default is 'None').
     """
-    results = elem.xpath('{path}/text()'.format(path=path))
-    if results:
-        return fmt(results[0])
-    return default
-
-def fast_iter(context, func, *args, **kwargs):
-    """Fast XML iterator for huge XML files.
-    http://lxml.de/parsing.html#modifying-the-tree
-    Based on Liza Daly's fast_iter
-    http://www.ibm.com/developerworks/xml/library/x-hiperfparse/
-    See also http://effbot.org/zone/element-iterparse.htm
+    text = fields.get(name)
+    if text is None:
+        return default
+    return fmt(text)
+
+def child_texts(elem):
+    """Returns dictionary of child element texts by tag (first occurrence)."""
+    fields = {}
+    for child in elem:
+        fields.setdefault(child.tag, child.text)
+    return fields
+
+def texts_cache_key(key):
+    """Returns cache key of long texts for compiled menu cache *key*."""
+    return key + ('texts', )
+
+def menu_cache_filename(key):
+    """Returns compiled menu cache filename for cache *key*."""
+    digest, parse_algorithms, parse_externals = key[:3]
+    suffix = ''.join(['-{0}'.format(name) for name in key[3:]])
+    return os.path.join(TDF.CACHE_DIR, 'menu-{0}-{1:d}{2:d}{3}.pickle'.format(digest, parse_algorithms, parse_externals, suffix))
+
+def read_menu_cache(key):
+    """Returns cached compiled menu or None if missing or outdated."""
+    try:
+        with open(menu_cache_filename(key), 'rb') as fp:
+            version, state = pickle.load(fp)
+    except (IOError, OSError, EOFError, ValueError, TypeError, AttributeError, ImportError, pickle.UnpicklingError):
+        return None
+    if version != MENU_CACHE_VERSION:
+        return None
+    # Mark as recently used, see prune_menu_cache().
+    try:
+        os.utime(menu_cache_filename(key), None)
+    except OSError:
+        pass
+    return state
+
+def write_menu_cache(key, state):
+    """Write compiled menu cache, silently ignores write errors (eg. read-only
+    home directories). Returns True on success."""
+    cachefile = menu_cache_filename(key)
+    try:
+        dirname = os.path.dirname(cachefile)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # Write to temporary file and rename for concurrent processes.
+        fd, tmpname = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump((MENU_CACHE_VERSION, state), fp, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmpname, cachefile)
+    except (IOError, OSError, pickle.PicklingError):
+        return False
+    return True
+
+def prune_menu_cache(limit=MENU_CACHE_LIMIT):
+    """Remove least recently used compiled menus exceeding *limit* menus,
+    the state and texts files of a menu are removed together. Silently
+    ignores errors (eg. files removed by concurrent processes). Menus of
+    removed files are parsed again on next load."""
+    menus = {}
+    for cachefile in glob.glob(os.path.join(TDF.CACHE_DIR, 'menu-*.pickle')):
+        try:
+            mtime = os.path.getmtime(cachefile)
+        except OSError:
+            continue
+        cachefiles = menus.setdefault(cachefile.replace('-texts.pickle', '.pickle'), [])
+        cachefiles.append((mtime, cachefile))
+    ranked = sorted(menus.values(), key=lambda cachefiles: max(cachefiles), reverse=True)
+    for cachefiles in ranked[limit:]:
+        for _, cachefile in cachefiles:
+            try:
+                os.remove(cachefile)
+            except OSError:
+                pass
+
+class MenuTexts(object):
+    """Lazy loaded long texts of a compiled menu (algorithm expressions and
+    comments, external signal descriptions and labels). Texts are read on
+    first access from the compiled menu cache or, if missing, by parsing menu
+    file *filename* again. Argument *key* is the compiled menu cache key.
     """
-    for event, elem in context:
-        func(elem, *args, **kwargs)
-        # It's safe to call clear() here because no descendants will be
-        # accessed
-        elem.clear()
-        # Also eliminate now-empty references from the root node to elem
-        for ancestor in elem.xpath('ancestor-or-self::*'):
-            while ancestor.getprevious() is not None:
-                del ancestor.getparent()[0]
-    del context
+
+    def __init__(self, key, filename, texts=None):
+        self.key = key
+        self.filename = filename
+        self._texts = texts
+
+    def __getstate__(self):
+        return (self.key, self.filename)
+
+    def __setstate__(self, state):
+        self.key, self.filename = state
+        self._texts = None
+
+    def get(self, key):
+        """Returns tuple of texts for record *key*."""
+        if self._texts is None:
+            self._texts = self.load()
+        return self._texts.get(key, ("", ""))
+
+    def load(self):
+        """Returns dictionary of text tuples by record key."""
+        texts = read_menu_cache(texts_cache_key(self.key))
+        if texts is None:
+            with open(self.filename, 'rb') as fp:
+                content = fp.read()
+            digest, parse_algorithms, parse_externals = self.key
+            if hashlib.sha1(content).hexdigest() != digest:
+                raise RuntimeError("menu file {0} changed since it was loaded".format(self.filename))
+            menu = XmlMenu(parse_algorithms=parse_algorithms, parse_externals=parse_externals)
+            _, texts = menu._parse(BytesIO(content))
+            write_menu_cache(texts_cache_key(self.key), texts)
+        return texts
 
 class Algorithm(object):
-    """Algorithm container class."""
-    def __init__(self, index, name, expression, module_id=0, module_index=0, comment=None):
+    """Algorithm record class. Expression and comment of algorithms loaded
+    from a menu are read on first access."""
+    __slots__ = ('index', 'name', 'module_id', 'module_index', '_expression', '_comment', '_texts')
+    def __init__(self, index, name, expression, module_id=0, module_index=0, comment=None, texts=None):
         self.index = index
         self.name = name
-        self.expression = expression
+        self._expression = expression
         self.module_id = module_id
         self.module_index = module_index
-        self.comment = comment or ""
+        self._comment = comment
+        self._texts = texts
+    def _loadTexts(self):
+        self._expression, self._comment = self._texts.get(('algorithm', self.index))
+        self._texts = None
+    @property
+    def expression(self):
+        if self._texts is not None:
+            self._loadTexts()
+        return self._expression
+    @expression.setter
+    def expression(self, expression):
+        if self._texts is not None:
+            self._loadTexts()
+        self._expression = expression
+    @property
+    def comment(self):
+        if self._texts is not None:
+            self._loadTexts()
+        return self._comment or ""
+    @comment.setter
+    def comment(self, comment):
+        if self._texts is not None:
+            self._loadTexts()
+        self._comment = comment
     def __repr__(self):
         return "Algorithm(index={self.index}, " \
                "name=\"{self.name}\", " \
@@ -95,14 +242,40 @@ class Algorithm(object):
                "module(id={self.module_id}, index={self.module_index}))".format(**locals())
 
 class ExternalSignal(object):
-    """External signal container class."""
-    def __init__(self, name, system, cable, channel, description=None, label=None):
+    """External signal record class. Description and label of signals loaded
+    from a menu are read on first access."""
+    __slots__ = ('name', 'system', 'cable', 'channel', '_description', '_label', '_texts')
+    def __init__(self, name, system, cable, channel, description=None, label=None, texts=None):
         self.name = name
         self.system = system
         self.cable = cable
         self.channel = channel
-        self.description = description or ""
-        self.label = label or ""
+        self._description = description
+        self._label = label
+        self._texts = texts
+    def _loadTexts(self):
+        self._description, self._label = self._texts.get(('ext_signal', self.name))
+        self._texts = None
+    @property
+    def description(self):
+        if self._texts is not None:
+            self._loadTexts()
+        return self._description or ""
+    @description.setter
+    def description(self, description):
+        if self._texts is not None:
+            self._loadTexts()
+        self._description = description
+    @property
+    def label(self):
+        if self._texts is not None:
+            self._loadTexts()
+        return self._label or ""
+    @label.setter
+    def label(self, label):
+        if self._texts is not None:
+            self._loadTexts()
+        self._label = label
     def __repr__(self):
         return \
             "ExternalSignal(name=\"{self.name}\", " \
@@ -110,32 +283,84 @@ class ExternalSignal(object):
             "cable={self.cable}, " \
             "channel={self.channel})".format(**locals())
 
-class AlgorithmContainer(list):
+class IndexedContainer(list):
+    """List container with hash indexes for lookups by item attributes listed
+    in *KEYS*. Indexes are built on first lookup (or by calling *reindex()*)
+    and discarded on any modification of the list. Note: after modifying
+    attributes of contained items call *reindex()*.
+    """
+
+    KEYS = ()
+
+    def __init__(self, *args):
+        super(IndexedContainer, self).__init__(*args)
+        self._indexes = None
+
+    def reindex(self):
+        """Build indexes for all keys, preserving the order of items."""
+        indexes = dict([(key, {}) for key in self.KEYS])
+        for item in self:
+            for key in self.KEYS:
+                indexes[key].setdefault(getattr(item, key), []).append(item)
+        self._indexes = indexes
+
+    def lookup(self, key, value):
+        """Returns list of items with attribute *key* equal to *value*."""
+        if self._indexes is None:
+            self.reindex()
+        return list(self._indexes[key].get(value, ()))
+
+    def lookupFirst(self, key, value):
+        """Returns first item with attribute *key* equal to *value* or None."""
+        if self._indexes is None:
+            self.reindex()
+        return self._indexes[key].get(value, [None])[0]
+
+def _invalidating(name):
+    """Returns list method *name* discarding the container indexes."""
+    method = getattr(list, name)
+    def wrapper(self, *args, **kwargs):
+        self._indexes = None
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+for name in ('append', 'extend', 'insert', 'remove', 'pop', 'sort', 'reverse',
+             '__setitem__', '__delitem__', '__setslice__', '__delslice__', '__iadd__', '__imul__'):
+    setattr(IndexedContainer, name, _invalidating(name))
+
+class AlgorithmContainer(IndexedContainer):
     """List container with extended lookup methods for content."""
+    KEYS = ('index', 'name', 'module_id', 'module_index')
     def byIndex(self, index):
         """Retruns algorithm by index or None if not found."""
-        return filter_first(lambda algorithm: algorithm.index == index, self)
+        return self.lookupFirst('index', index)
     def byModuleId(self, id):
         """Returns list of algorithms assigned to module id or empty list if none found."""
-        return filter(lambda algorithm: algorithm.module_id == id, self)
+        return self.lookup('module_id', id)
     def byModuleIndex(self, index):
         """Returns list of algorithms assigned to module index or empty list if none found."""
-        return filter(lambda algorithm: algorithm.module_index == index, self)
+        return self.lookup('module_index', index)
     def byName(self, name):
         """Retruns algorithm by name or None if not found."""
-        return filter_first(lambda algorithm: algorithm.name == name, self)
+        return self.lookupFirst('name', name)
 
-class ExternalSignalContainer(list):
+class ExternalSignalContainer(IndexedContainer):
     """External signal list container with extended lookup methods."""
+    KEYS = ('name', 'system', 'cable', 'channel')
     def byName(self, name):
         """Retruns external signal by name or None if not found."""
-        return filter_first(lambda signal: signal.name == name, self)
+        return self.lookupFirst('name', name)
     def bySystem(self, system):
         """Returns list of external signals assigned to system or empty list if none found."""
-        return filter(lambda signal: signal.system == system, self)
+        return self.lookup('system', system)
     def byCable(self, cable):
         """Returns list of external signals assigned to cable or empty list if none found."""
-        return filter(lambda signal: signal.cable == cable, self)
+        return self.lookup('cable', cable)
+    def byChannel(self, channel):
+        """Returns list of external signals assigned to channel or empty list if none found."""
+        return self.lookup('channel', channel)
 
 class XmlMenu(object):
     """Container holding some information of the XML menu.
@@ -176,54 +401,119 @@ class XmlMenu(object):
         if filename: self.read(filename)
 
     def read(self, filename):
-        """Read XML from file and parse its content."""
+        """Read XML from file and parse its content. Compiled menus are cached
+        by file content (see TDF.CACHE_DIR), loading a menu again does not parse
+        the XML file. Only the MENU_CACHE_LIMIT most recently used menus are
+        kept on disk and the MENU_MEMORY_LIMIT most recently used menus are
+        kept pickled in process, every menu owns its records."""
         self.filename = os.path.abspath(filename)
-        self.algorithms = AlgorithmContainer()
-        self.externals = ExternalSignalContainer()
         with open(self.filename, 'rb') as fp:
-            # Access meta data
-            context = etree.parse(fp)
-            self.name = get_xpath(context, 'name')
-            self.uuid_menu = get_xpath(context, 'uuid_menu')
-            self.uuid_firmware = get_xpath(context, 'uuid_firmware')
-            self.grammar_version = get_xpath(context, 'grammar_version')
-            self.is_valid = get_xpath(context, 'is_valid', bool)
-            self.is_obsolete = get_xpath(context, 'is_obsolete', bool)
-            self.n_modules = get_xpath(context, 'n_modules', int)
-            self.comment = get_xpath(context, 'comment', default="")
-            self.ext_signal_set = get_xpath(context, 'ext_signal_set/name', default="")
-            if self.parse_algorithms:
-                # Access list of algorithms
-                fp.seek(0) # Seek begin of file
-                context = etree.iterparse(fp, tag='algorithm')
-                fast_iter(context, self._load_algorithm)
-            if self.parse_externals:
-                # Access list of external signals
-                fp.seek(0) # Seek begin of file
-                context = etree.iterparse(fp, tag='ext_signal')
-                fast_iter(context, self._load_external)
-
-    def _load_algorithm(self, elem):
-        """Fetch information from an algorithm tag and appends it to the list of algorithms."""
-        name = get_xpath(elem, 'name')
-        index = get_xpath(elem, 'index', int)
-        expression = get_xpath(elem, 'expression')
-        module_id = get_xpath(elem, 'module_id', int)
-        module_index = get_xpath(elem, 'module_index', int)
-        comment = get_xpath(elem, 'comment', default="")
-        algorithm = Algorithm(index, name, expression, module_id, module_index, comment)
-        self.algorithms.append(algorithm)
-
-    def _load_external(self, elem):
-        """Fetch information from an algorithm tag and appends it to the list of algorithms."""
-        name = get_xpath(elem, 'name')
-        system = get_xpath(elem, 'system')
-        cable = get_xpath(elem, 'cable', int)
-        channel = get_xpath(elem, 'channel', int)
-        description = get_xpath(elem, 'description', default="")
-        label = get_xpath(elem, 'label', default="")
-        external = ExternalSignal(name, system, cable, channel, description, label)
-        self.externals.append(external)
+            content = fp.read()
+        key = (hashlib.sha1(content).hexdigest(), bool(self.parse_algorithms), bool(self.parse_externals))
+        texts = None
+        if key in _menu_cache:
+            data, texts = _menu_cache.pop(key)
+            state = pickle.loads(data)
+        else:
+            state = read_menu_cache(key)
+            if state is None:
+                state, texts = self._parse(BytesIO(content))
+                # Keep long texts in memory only if they can not be reloaded from cache.
+                if write_menu_cache(texts_cache_key(key), texts):
+                    texts = None
+                state['texts'] = MenuTexts(key, self.filename, texts)
+                if write_menu_cache(key, state):
+                    prune_menu_cache()
+            data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+        _menu_cache[key] = (data, texts)
+        while len(_menu_cache) > MENU_MEMORY_LIMIT:
+            _menu_cache.popitem(last=False)
+        if texts is not None:
+            state['texts']._texts = texts
+        self._attachTexts(state)
+        self._restore(state)
+
+    def _attachTexts(self, state):
+        """Attach lazy loaded long texts to records of compiled menu *state*,
+        texts are read from this menu's file if not cached."""
+        texts = state['texts']
+        texts.filename = self.filename
+        for record in state['algorithms']:
+            record._texts = texts
+        for record in state['externals']:
+            record._texts = texts
+
+    def _parse(self, fp):
+        """Parse menu from XML file stream in a single pass, returns compiled
+        menu state (dictionary of meta data, algorithms and external signals)
+        and dictionary of long texts by record key. Repeated strings are
+        interned."""
+        state = dict([(name, default) for name, (_, default) in META_FIELDS.items()])
+        state['ext_signal_set'] = ""
+        algorithms = []
+        externals = []
+        texts = {}
+        strings = {}
+        for event, elem in etree.iterparse(fp, events=('end', )):
+            tag = elem.tag
+            if tag == 'algorithm':
+                if self.parse_algorithms:
+                    fields = child_texts(elem)
+                    algorithm = self._load_algorithm(fields)
+                    algorithms.append(algorithm)
+                    texts[('algorithm', algorithm.index)] = (get_text(fields, 'expression'), get_text(fields, 'comment', default=""))
+                elem.clear()
+            elif tag == 'ext_signal':
+                if self.parse_externals:
+                    fields = child_texts(elem)
+                    external = self._load_external(fields)
+                    external.system = strings.setdefault(external.system, external.system)
+                    externals.append(external)
+                    texts[('ext_signal', external.name)] = (get_text(fields, 'description', default=""), get_text(fields, 'label', default=""))
+                elem.clear()
+            else:
+                parent = elem.getparent()
+                if parent is None:
+                    continue
+                if parent.getparent() is None:
+                    # Meta data (child of root element)
+                    if tag in META_FIELDS:
+                        fmt, default = META_FIELDS[tag]
+                        state[tag] = default if elem.text is None else fmt(elem.text)
+                elif tag == 'name' and parent.tag == 'ext_signal_set' and parent.getparent().getparent() is None:
+                    state['ext_signal_set'] = elem.text or ""
+        state['algorithms'] = algorithms
+        state['externals'] = externals
+        return state, texts
+
+    def _restore(self, state):
+        """Restore menu from compiled menu *state*, the menu takes ownership
+        of the records."""
+        for name in META_FIELDS.keys() + ['ext_signal_set']:
+            setattr(self, name, state[name])
+        self.algorithms = AlgorithmContainer(state['algorithms'])
+        self.externals = ExternalSignalContainer(state['externals'])
+        # Build lookup indexes once
+        self.algorithms.reindex()
+        self.externals.reindex()
+
+    def _load_algorithm(self, fields):
+        """Returns algorithm from dictionary of algorithm tag child texts,
+        expression and comment are loaded lazily."""
+        name = get_text(fields, 'name')
+        index = get_text(fields, 'index', int)
+        module_id = get_text(fields, 'module_id', int)
+        module_index = get_text(fields, 'module_index', int)
+        return Algorithm(index, name, None, module_id, module_index)
+
+    def _load_external(self, fields):
+        """Returns external signal from dictionary of ext_signal tag child
+        texts, description and label are loaded lazily."""
+        name = get_text(fields, 'name')
+        system = get_text(fields, 'system')
+        cable = get_text(fields, 'cable', int)
+        channel = get_text(fields, 'channel', int)
+        return ExternalSignal(name, system, cable, channel)
 
 if __name__ == '__main__':
     """Basic unittest..."""
@@ -12,6 +12,7 @@ from tdf.core.filereader import FileReader
 from tdf.core.testvector import TestVector
 from tdf.core.images import (
     ColumnMemoryImage,
+    dword_arrays,
 )
 from tdf.core.binutils import (
     bitmask,
@@ -36,6 +37,14 @@ class ExtCondMemoryImage(ColumnMemoryImage):
         values = self.merged()[:TDF.ORBIT_LENGTH]
         return values[offset:] + values[:offset]
 
+    def objectColumns(self):
+        """Returns list of tuples (key, specification, columns)."""
+        return [('extcond', None, [self.extconds()])]
+
+    def columnArrays(self):
+        """Returns list of (name, array) tuples of external conditions."""
+        return dword_arrays('extcond', self.extconds(), 2)
+
     def read(self, fs):
         """Read from simple dump file."""
         self.clear()
@@ -19,6 +19,7 @@ from tdf.core.binutils import (
     bitjoin,
     bitsplit,
 )
+from array import array
 import json
 import sys
 
@@ -66,6 +67,23 @@ class Finor502MemoryImage(ColumnMemoryImage):
         values = [(value >> 16) & mask for value in values]
         return values[offset:] + values[:offset]
 
+    def objectColumns(self):
+        """Returns list of tuples (key, specification, columns)."""
+        return [
+            ('finor', None, [self.finors()]),
+            ('veto', None, [self.vetos()]),
+            ('finor2tcds', None, [self.finors2tcds()]),
+        ]
+
+    def columnArrays(self):
+        """Returns list of (name, array) tuples of FinOR, veto and FinOR to
+        TCDS bits."""
+        return [
+            ('finor', array('B', self.finors())),
+            ('veto', array('B', self.vetos())),
+            ('finor2tcds', array('B', self.finors2tcds())),
+        ]
+
     def __str__(self):
         finors = self.finors()
         vetos = self.vetos()
@@ -5,11 +5,53 @@
 #
 
 """Buffer generator class for tx/rx buffer patterns.
+
+Besides the MP7 butler text format buffer patterns can be written to a compact
+binary format (see method *Buffgen.dumpBinary()*).
+
+Binary buffer format
+--------------------
+
+=========  =======================================================
+Size       Description
+=========  =======================================================
+4 bytes    magic string `MP7B'
+1 byte     format version
+1 byte     padding
+2 bytes    number of links (little endian)
+4 bytes    number of frames (little endian)
+32 bytes   board ID (zero padded string)
+links *    frame data DWORDs (little endian), link by link
+frames * 4
+links *    frame valid flags (one byte each), link by link
+frames
+=========  =======================================================
+
 """
 
 from tdf.core import binutils
+from tdf.core.settings import TDF
 from tdf.core.testvector import TestVector
 
+from array import array
+import struct
+import sys, re
+
+# Binary buffer file format.
+BINARY_MAGIC = 'MP7B'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sBxHI32s')
+
+# Array type code for unsigned 32 bit values.
+DWORD_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+# Frames per BX in the 240 MHz domain.
+FRAMES_PER_BX = 6
+
+# Regular expressions for parsing buffer text files and captures.
+FRAME_REGEX = re.compile(r'^\s*Frame\s+\d+\s*:(.*)$')
+VALUE_REGEX = re.compile(r'(?:[01]s)?([01])v([0-9a-fA-F]{8})')
+
 # -----------------------------------------------------------------------------
 #  Helpers.
 # -----------------------------------------------------------------------------
@@ -53,6 +95,116 @@ def high(value):
     """Return higher DWORD of value."""
     return binutils.bitsplit(value, 2, 32)[1]
 
+def link_list(links):
+    """Returns sorted list of link indices from link selection string using the
+    MP7 butler notation.
+    >>> link_list("0-3,8")
+    [0, 1, 2, 3, 8]
+    """
+    indices = set()
+    for token in str(links).split(','):
+        token = token.strip()
+        if not token:
+            continue
+        try:
+            if '-' in token:
+                b, e = token.split('-')
+                indices.update(range(int(b), int(e) + 1))
+            else:
+                indices.add(int(token))
+        except ValueError:
+            raise ValueError("invalid link selection `{links}'".format(**locals()))
+    return sorted(indices)
+
+def is_binary(filename):
+    """Returns True if file *filename* is a binary buffer file."""
+    with open(filename, 'rb') as fs:
+        return fs.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+def iter_frames(fs):
+    """Yields frames parsed line by line from MP7 buffer text file stream
+    *fs* (as written by Buffgen or captured by mp7butler). Header lines are
+    skipped.
+    """
+    for line in fs:
+        match = FRAME_REGEX.match(line)
+        if match:
+            yield [(int(valid), int(value, 16)) for valid, value in VALUE_REGEX.findall(match.group(1))]
+
+def iter_chunks(frames, size=FRAMES_PER_BX):
+    """Yields lists of *size* frames from iterable *frames*, an incomplete
+    trailing chunk is dropped.
+    """
+    chunk = []
+    for frame in frames:
+        chunk.append(frame)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+def decode_bx(chunk):
+    """Returns dictionary of object values (like a TestVectorReader row) for
+    one BX of six frames. This inverts the object mapping used by method
+    *Buffgen.testVectorFrames()*, missing links are decoded as zero.
+    """
+    values = [[value for valid, value in frame] for frame in chunk]
+    def link(frame, n):
+        return values[frame][n] if n < len(values[frame]) else 0
+    row = {}
+    row['muon'] = [0] * TDF.MUON.count
+    for i in range(4):
+        row['muon'][i * 2] = binutils.bitjoin((link(2, i), link(3, i)), 32)
+        row['muon'][i * 2 + 1] = binutils.bitjoin((link(4, i), link(5, i)), 32)
+    row['eg'] = [link(frame, 4) for frame in range(6)] + [link(frame, 5) for frame in range(6)]
+    row['jet'] = [link(frame, 6) for frame in range(6)] + [link(frame, 7) for frame in range(6)]
+    row['tau'] = [link(frame, 8) for frame in range(6)] + [link(frame, 9) for frame in range(6)]
+    for frame, name in enumerate(('ett', 'ht', 'etm', 'htm', 'etmhf', 'htmhf')):
+        row[name] = link(frame, 10)
+    for frame in range(6):
+        row['link_11_fr_{0}'.format(frame)] = link(frame, 11)
+    row['ext_con'] = binutils.bitjoin([link(frame, n) for n in range(12, 16) for frame in range(2)], 32)
+    row['algorithm'] = 0
+    row['finor'] = 0
+    return row
+
+def str_testvector_row(bx, row):
+    """Returns test vector line for object values of *row*."""
+    cols = ['{bx:04d}'.format(**locals())]
+    cols.extend(TDF.MUON.hexstr(value) for value in row['muon'])
+    cols.extend(TDF.EG.hexstr(value) for value in row['eg'])
+    cols.extend(TDF.TAU.hexstr(value) for value in row['tau'])
+    cols.extend(TDF.JET.hexstr(value) for value in row['jet'])
+    cols.append(TDF.ETT.hexstr(row['ett']))
+    cols.append(TDF.HT.hexstr(row['ht']))
+    cols.append(TDF.ETM.hexstr(row['etm']))
+    cols.append(TDF.HTM.hexstr(row['htm']))
+    cols.append(TDF.ETMHF.hexstr(row['etmhf']))
+    cols.append(TDF.HTMHF.hexstr(row['htmhf']))
+    cols.append(TDF.LINK_11_FR_0.hexstr(row['link_11_fr_0']))
+    cols.append(TDF.LINK_11_FR_1.hexstr(row['link_11_fr_1']))
+    cols.append(TDF.LINK_11_FR_2.hexstr(row['link_11_fr_2']))
+    cols.append(TDF.LINK_11_FR_3.hexstr(row['link_11_fr_3']))
+    cols.append(TDF.LINK_11_FR_4.hexstr(row['link_11_fr_4']))
+    cols.append(TDF.LINK_11_FR_5.hexstr(row['link_11_fr_5']))
+    cols.append(TDF.EXTCOND.hexstr(row['ext_con']))
+    cols.append(TDF.ALGORITHM.hexstr(row['algorithm']))
+    cols.append(TDF.FINOR.hexstr(row['finor']))
+    return ' '.join(cols)
+
+def raw_buffer(frames, link):
+    """Returns raw MP7 channel buffer DWORDs of *link* for list of *frames*.
+    Each 32 bit frame value occupies two buffer words of 16 bit data with the
+    valid flag assigned to bit 16.
+    """
+    mask = binutils.bitmask(16)
+    values = []
+    for frame in frames:
+        valid, value = frame[link]
+        flag = (valid & 0x1) << 16
+        values.append(flag | (value & mask))
+        values.append(flag | ((value >> 16) & mask))
+    return values
+
 # -----------------------------------------------------------------------------
 #  Buffer generator class.
 # -----------------------------------------------------------------------------
@@ -60,6 +212,8 @@ def high(value):
 class Buffgen(object):
     """Generates buffer images using patterns or test vector files.
 
+    Frames are represented as list of (valid, value) tuples, one for every link.
+
     Examples
     --------
 
@@ -71,6 +225,14 @@ class Buffgen(object):
         Generates a buffer pattern from test vector file.
         >>> buffgen.fromTestVector('sample.txt', quads = 4, frames = 1024)
 
+        Writes a buffer pattern to a binary file.
+        >>> with open('sample.bin', 'wb') as fs:
+        ...     buffgen.dumpBinary(buffgen.frames('sample.txt', 4, 1024), fs)
+
+        Converts a captured buffer back to a test vector.
+        >>> with open('sample_tv.txt', 'w') as fs:
+        ...     buffgen.toTestVector('rx_summary.txt', fs)
+
     """
 
     def __init__(self, board = None):
@@ -98,36 +260,38 @@ class Buffgen(object):
 
         return lines
 
-    def zero(self, quads = 4, frames = 1024):
+    def render(self, frames, quads = 4):
+        """Returns text buffer pattern for list of *frames*."""
         lines = []
-        for frame in range(frames):
-            line = []
-            line.append(str_frame(frame))
-            for quad in range(quads):
-                for channel in range(4):
-                    line.append(str_value())
+        for frame, values in enumerate(frames):
+            line = [str_frame(frame)]
+            line.extend(str_value(value, valid) for valid, value in values[:quads * 4])
             lines.append(' '.join(line))
-        # Resize if needed.
-        return '\n'.join(self.header(quads) + lines[:frames])
+        return '\n'.join(self.header(quads) + lines)
 
-    def counter(self, quads = 4, frames = 1024):
-        lines = []
+    def zeroFrames(self, quads = 4, frames = 1024):
+        """Returns list of zero frames."""
+        return [[(1, 0)] * (quads * 4) for _ in range(frames)]
+
+    def counterFrames(self, quads = 4, frames = 1024):
+        """Returns list of HB counter pattern frames."""
+        result = []
         for frame in range(frames):
-            line = []
-            line.append(str_frame(frame))
+            values = []
             for quad in range(quads):
                 for channel in range(4):
-                    line.append(str_value(counter_value(quad, channel, frame), True))
-            lines.append(' '.join(line))
-        # Resize if needed.
-        return '\n'.join(self.header(quads) + lines[:frames])
+                    values.append((1, counter_value(quad, channel, frame)))
+            result.append(values)
+        return result
 
-    def fromTestVector(self, filename, quads = 4, frames = 1024):
-        lines = []
+    def testVectorFrames(self, filename, quads = 4, frames = 1024):
+        """Returns list of frames mapped from test vector file *filename*."""
+        result = []
+        links = quads * 4
         with open(filename) as fs:
             tv = TestVector(fs)
             for i in range(len(tv.extconds())):
-                if len(lines) > frames:
+                if len(result) >= frames:
                     break
                 # Split external conditions into DWORDS (8 x 32 bit)
                 extconds = binutils.bitsplit(tv.extconds()[i], 8, 32)
@@ -142,17 +306,95 @@ class Buffgen(object):
                     [low(tv.muon(1)[i]),  low(tv.muon(3)[i]),  low(tv.muon(5)[i]),  low(tv.muon(7)[i]),  tv.eg(4)[i], tv.eg(10)[i], tv.jet(4)[i], tv.jet(10)[i], tv.tau(4)[i], tv.tau(10)[i], tv.etmhf()[i],  0, 0,           0,           0,           0,           ],
                     [high(tv.muon(1)[i]), high(tv.muon(3)[i]), high(tv.muon(5)[i]), high(tv.muon(7)[i]), tv.eg(5)[i], tv.eg(11)[i], tv.jet(5)[i], tv.jet(11)[i], tv.tau(5)[i], tv.tau(11)[i], tv.htmhf()[i],  0, 0,           0,           0,           0,           ],
                 ]
-                # Convert to value format.
-                for ii in range(len(mapped_values)):
-                    mapped_values[ii] = [str_value(value) for value in mapped_values[ii]]
-                for frame in range(6):
-                    line = []
-                    line.append(str_frame((i * 6)+ frame))
-                    line.extend(mapped_values[frame])
-                    line.extend([str_value(0)] * ((quads * 4) - (len(line) - 1)))
-                    lines.append(' '.join(line[:(quads * 4) + 1]))
-            # Resize if needed.
-            return '\n'.join(self.header(quads) + lines[:frames])
-
-    def toTestVector(self, filename):
-        tv = TestVector()
+                for values in mapped_values:
+                    values = [(1, value) for value in values]
+                    values.extend([(1, 0)] * (links - len(values)))
+                    result.append(values[:links])
+        # Resize if needed.
+        return result[:frames]
+
+    def frames(self, pattern, quads = 4, frames = 1024):
+        """Returns list of frames for *pattern* being either a generic pattern
+        (:zero, :counter), a binary buffer file or a test vector file.
+        """
+        if pattern.startswith(":"):
+            if pattern in (':zero', ):
+                return self.zeroFrames(quads, frames)
+            elif pattern in (':counter', ):
+                return self.counterFrames(quads, frames)
+            raise RuntimeError("no such pattern `{pattern}', try `:zero' or `:counter' instead".format(**locals()))
+        if is_binary(pattern):
+            with open(pattern, 'rb') as fs:
+                return self.readBinary(fs)[:frames]
+        return self.testVectorFrames(pattern, quads, frames)
+
+    def zero(self, quads = 4, frames = 1024):
+        return self.render(self.zeroFrames(quads, frames), quads)
+
+    def counter(self, quads = 4, frames = 1024):
+        return self.render(self.counterFrames(quads, frames), quads)
+
+    def fromTestVector(self, filename, quads = 4, frames = 1024):
+        return self.render(self.testVectorFrames(filename, quads, frames), quads)
+
+    def dumpBinary(self, frames, fs):
+        """Writes list of *frames* in binary buffer format to file stream *fs*."""
+        links = len(frames[0]) if frames else 0
+        data = array(DWORD_TYPECODE)
+        valids = array('B')
+        for link in range(links):
+            data.extend(frame[link][1] & 0xffffffff for frame in frames)
+            valids.extend(frame[link][0] & 0x1 for frame in frames)
+        if sys.byteorder != 'little':
+            data.byteswap()
+        fs.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, links, len(frames), self.board[:32]))
+        fs.write(data.tostring())
+        fs.write(valids.tostring())
+
+    def readBinary(self, fs):
+        """Reads binary buffer format from file stream *fs*, returns list of
+        frames.
+        """
+        header = fs.read(BINARY_HEADER.size)
+        if len(header) != BINARY_HEADER.size:
+            raise ValueError("invalid binary buffer file, incomplete header")
+        magic, version, links, count, board = BINARY_HEADER.unpack(header)
+        if magic != BINARY_MAGIC:
+            raise ValueError("invalid binary buffer file, missing magic `{BINARY_MAGIC}'".format(**globals()))
+        if version != BINARY_VERSION:
+            raise ValueError("unsupported binary buffer file version {version}".format(**locals()))
+        data = array(DWORD_TYPECODE)
+        data.fromstring(fs.read(links * count * data.itemsize))
+        valids = array('B')
+        valids.fromstring(fs.read(links * count))
+        if len(data) != links * count or len(valids) != links * count:
+            raise ValueError("invalid binary buffer file, truncated data")
+        if sys.byteorder != 'little':
+            data.byteswap()
+        columns = [zip(valids[link * count:(link + 1) * count], data[link * count:(link + 1) * count]) for link in range(links)]
+        return [list(frame) for frame in zip(*columns)]
+
+    def toTestVector(self, filename, outfile, offset = 0, size = TDF.ORBIT_LENGTH):
+        """Decodes MP7 buffer file *filename* (text, capture or binary format)
+        and writes test vector rows to file stream *outfile*. Frames are
+        decoded in chunks of one BX, rows are written incrementally. Optional
+        *offset* skips leading frames to align to the first BX, *size* limits
+        the number of written BX. Algorithms and FINOR are not contained in
+        the buffers and are written as zero. Returns the number of written BX.
+        """
+        with open(filename, 'rb') as fs:
+            if is_binary(filename):
+                frames = iter(self.readBinary(fs))
+            else:
+                frames = iter_frames(fs)
+            for _ in range(offset):
+                next(frames, None)
+            bx = 0
+            for chunk in iter_chunks(frames):
+                if bx >= size:
+                    break
+                outfile.write(str_testvector_row(bx, decode_bx(chunk)))
+                outfile.write('\n')
+                bx += 1
+        outfile.flush()
+        return bx
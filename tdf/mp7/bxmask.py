@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2013-2017 Bernhard Arnold <bernahrd.arnold@cern.ch>
+#
+
+"""Algorithm BX mask compiler.
+
+Compiles BX mask files to bit-planes (one bitset of enabled BX per algorithm)
+working on BX intervals, ready to be written to an AlgoBxMemoryImage.
+
+Syntax
+------
+
+    # comment
+    @<name> = <bx>, ...           define a named bunch pattern
+    <algorithms>: <bx>, ...       mask algorithms in BX
+
+Algorithms are comma separated indices `42', ranges `16-31' or wildcard `*'
+for all algorithms. BX are given as
+
+=============  ==========================================================
+Syntax         Description
+=============  ==========================================================
+42             single BX
+100-200        range of BX (inclusive)
+*              all BX of orbit
+@<name>        named bunch pattern (see BX_PATTERNS or file definitions)
+100-147/60x4   train: range repeated 4 times with a period of 60 BX
+=============  ==========================================================
+
+Example
+-------
+
+    @gap = 3443-3563
+    *: @gap
+    42: 0-9, 100-147/60x4
+
+    >>> compiler = BxMaskCompiler()
+    >>> planes = compiler.compile(open('bxmask.txt'))
+    >>> planes.test(42, 100) # False, algorithm 42 is masked in BX 100
+
+"""
+
+from tdf.core import TDF
+from tdf.core.binutils import bitmask, bitscan, BitPlanes
+import re
+
+__all__ = [ 'BX_PATTERNS', 'BxMaskCompiler', '__doc__', ]
+
+BX_PATTERNS = {
+    'abort_gap': '3443-3563',
+}
+"""Predefined named bunch patterns."""
+
+BX_TRAIN_REGEX = re.compile(r'^(\d+)-(\d+)/(\d+)x(\d+)$')
+BX_RANGE_REGEX = re.compile(r'^(\d+)(?:-(\d+))?$')
+PATTERN_REGEX = re.compile(r'^@(\w+)\s*=\s*(.*)$')
+
+class BxMaskCompiler(object):
+    """Compiles BX mask definitions to algorithm bit-planes. Optional
+    *patterns* is a dictionary of additional named bunch patterns."""
+
+    def __init__(self, patterns=None, length=TDF.ORBIT_LENGTH, width=TDF.ALGORITHM.width):
+        self.patterns = dict(BX_PATTERNS)
+        self.patterns.update(patterns or {})
+        self.length = length
+        self.width = width
+
+    def interval(self, begin, end, limit):
+        """Returns bitset of interval *begin* to *end* (inclusive)."""
+        if not 0 <= begin <= end < limit:
+            raise ValueError("invalid range {begin}-{end}".format(**locals()))
+        return bitmask(end - begin + 1) << begin
+
+    def parseBx(self, text, stack=()):
+        """Returns bitset of BX defined by comma separated BX *text*."""
+        bxs = 0
+        for token in [token.strip() for token in text.split(',') if token.strip()]:
+            if token.isdigit():
+                bxs |= self.interval(int(token), int(token), self.length)
+            elif token == '*':
+                bxs |= bitmask(self.length)
+            elif token.startswith('@'):
+                name = token[1:]
+                if name not in self.patterns:
+                    raise ValueError("no such bunch pattern `{name}'".format(**locals()))
+                if name in stack:
+                    raise ValueError("recursive bunch pattern `{name}'".format(**locals()))
+                bxs |= self.parseBx(self.patterns[name], stack + (name, ))
+            elif BX_TRAIN_REGEX.match(token):
+                begin, end, period, count = [int(value) for value in BX_TRAIN_REGEX.match(token).groups()]
+                for n in range(count):
+                    bxs |= self.interval(begin + n * period, end + n * period, self.length)
+            elif BX_RANGE_REGEX.match(token):
+                begin, end = BX_RANGE_REGEX.match(token).groups()
+                bxs |= self.interval(int(begin), int(end or begin), self.length)
+            else:
+                raise ValueError("invalid BX `{token}'".format(**locals()))
+        return bxs
+
+    def parseAlgorithms(self, text):
+        """Returns bitset of algorithms defined by comma separated *text*."""
+        algorithms = 0
+        for token in [token.strip() for token in text.split(',') if token.strip()]:
+            if token == '*':
+                algorithms |= bitmask(self.width)
+            elif BX_RANGE_REGEX.match(token):
+                begin, end = BX_RANGE_REGEX.match(token).groups()
+                algorithms |= self.interval(int(begin), int(end or begin), self.width)
+            else:
+                raise ValueError("invalid algorithm `{token}'".format(**locals()))
+        return algorithms
+
+    def masks(self, lines):
+        """Returns list of masked BX bitsets by algorithm from mask
+        definition *lines*."""
+        masks = [0] * self.width
+        for lineno, line in enumerate(lines, 1):
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            try:
+                pattern = PATTERN_REGEX.match(line)
+                if pattern:
+                    name, text = pattern.groups()
+                    self.patterns[name] = text
+                    continue
+                if ':' not in line:
+                    raise ValueError("missing `:'")
+                algorithms, bxs = line.split(':', 1)
+                bxs = self.parseBx(bxs)
+                algorithms = self.parseAlgorithms(algorithms)
+                for algorithm in bitscan(algorithms):
+                    masks[algorithm] |= bxs
+            except ValueError, e:
+                raise RuntimeError("error reading algorithm mask file in line {lineno}: {e}".format(**locals()))
+        return masks
+
+    def compile(self, lines):
+        """Returns BitPlanes of enabled BX by algorithm from mask definition
+        *lines* (eg. a file stream)."""
+        orbit = bitmask(self.length)
+        planes = [orbit & ~mask for mask in self.masks(lines)]
+        return BitPlanes.fromPlanes(planes, self.length)
@@ -21,17 +21,23 @@ of class TestVector to read data from test vector files.
 
 from tdf.core import TDF
 from tdf.core.filereader import FileReader
-from tdf.core.testvector import TestVector
+from tdf.core.testvector import TestVector, AlgorithmCountsMixin
+from tdf.core.unpacker import RecordData, RECORD_TYPECODE
 from tdf.core.images import (
     GenericMemoryImage,
     ColumnMemoryImage,
+    dword_arrays,
 )
 from tdf.core.binutils import (
     bitmask,
     charcount,
-    bitjoin,
     bitsplit,
+    bitscan,
+    bitdecode,
+    BitPlanes,
 )
+from collections import namedtuple
+from array import array
 import json
 import sys, re
 
@@ -467,107 +473,194 @@ class SimSpyMemoryImage(ColumnMemoryImage):
             lines.append(' '.join(line))
         return '\n'.join(lines)
 
-    def decode(self):
-        """Decode objects attributes to JSON, returns a JSON dictionary."""
-
-        data = []
-        muons, egs, taus, jets = self.muons(), self.egs(), self.taus(), self.jets()
-        ett, ht, etm, htm, etmhf, htmhf = self.ett(), self.ht(), self.etm(), self.htm(), self.etmhf(), self.htmhf()
-        link_11_fr_0, link_11_fr_1, link_11_fr_2 = self.link_11_fr_0(), self.link_11_fr_1(), self.link_11_fr_2()
-        link_11_fr_3, link_11_fr_4, link_11_fr_5 = self.link_11_fr_3(), self.link_11_fr_4(), self.link_11_fr_5()
-        extconds = self.extconds()
+    def objectColumns(self):
+        """Returns list of tuples (key, specification, columns) for all
+        objects, *columns* is a list of per object value columns."""
+        return [
+            ('muon', TDF.MUON, self.muons()),
+            ('eg', TDF.EG, self.egs()),
+            ('tau', TDF.TAU, self.taus()),
+            ('jet', TDF.JET, self.jets()),
+            ('ett', TDF.ETT, [self.ett()]),
+            ('ht', TDF.HT, [self.ht()]),
+            ('etm', TDF.ETM, [self.etm()]),
+            ('htm', TDF.HTM, [self.htm()]),
+            ('etmhf', TDF.ETMHF, [self.etmhf()]),
+            ('htmhf', TDF.HTMHF, [self.htmhf()]),
+            ('link_11_fr_0', TDF.LINK_11_FR_0, [self.link_11_fr_0()]),
+            ('link_11_fr_1', TDF.LINK_11_FR_1, [self.link_11_fr_1()]),
+            ('link_11_fr_2', TDF.LINK_11_FR_2, [self.link_11_fr_2()]),
+            ('link_11_fr_3', TDF.LINK_11_FR_3, [self.link_11_fr_3()]),
+            ('link_11_fr_4', TDF.LINK_11_FR_4, [self.link_11_fr_4()]),
+            ('link_11_fr_5', TDF.LINK_11_FR_5, [self.link_11_fr_5()]),
+        ]
+
+    def columnArrays(self):
+        """Returns list of (name, array) tuples of decoded object fields and
+        raw values, eg. 'muon_0.pt', 'muon_0.raw_0', 'muon_0.raw_1', 'ett.et'."""
+        arrays = []
+        for key, spec, columns in self.objectColumns():
+            for index, column in enumerate(columns):
+                name = '{key}_{index}'.format(**locals()) if spec.count > 1 else key
+                for field, values in sorted(spec.decodeColumn(column).items()):
+                    arrays.append(('{name}.{field}'.format(**locals()), array('I', values)))
+                arrays.extend(dword_arrays('{name}.raw'.format(**locals()), column, spec.dwords))
+        return arrays
+
+    def iterdecode(self, objects=None, skip_empty=False):
+        """Decode objects attributes, yields a dictionary for every BX.
+
+        Optional *objects* is a list of object keys to be decoded (eg.
+        ['muon', 'eg']). If *skip_empty* is True objects with value zero are
+        omitted, list entries are tagged with their 'index' and BX without any
+        object are skipped.
+        """
+        entries = self.objectColumns()
+        if objects is not None:
+            keys = [key for key, _, _ in entries]
+            for key in objects:
+                if key not in keys:
+                    raise ValueError("no such object type `{key}', try one of {keys}".format(**locals()))
+            entries = [entry for entry in entries if entry[0] in objects]
+
+        # Decode entire columns at once using precompiled slice tables.
+        decoded = []
+        for key, spec, columns in entries:
+            for index, column in enumerate(columns):
+                fields = spec.decodeColumn(column).items()
+                decoded.append((key, spec, index if spec.count > 1 else None, column, fields))
 
         for i in range(TDF.ORBIT_LENGTH):
             bx_data = {'bx': i}
+            empty = True
+            for key, spec, index, column, fields in decoded:
+                if skip_empty and not column[i]:
+                    continue
+                obj_data = dict([(name, values[i]) for name, values in fields])
+                obj_data['raw'] = spec.hexstr(column[i])
+                if index is None:
+                    bx_data[key] = obj_data
+                else:
+                    if skip_empty:
+                        obj_data['index'] = index
+                    bx_data.setdefault(key, []).append(obj_data)
+                empty = False
+            if skip_empty and empty:
+                continue
+            yield bx_data
 
-            bx_data['muon'] = []
-            for muon in muons:
-                obj_data = TDF.MUON.decode(muon[i])
-                obj_data['raw'] = TDF.MUON.hexstr(muon[i])
-                bx_data['muon'].append(obj_data)
-
-            bx_data['eg'] = []
-            for eg in egs:
-                obj_data = TDF.EG.decode(eg[i])
-                obj_data['raw'] = TDF.EG.hexstr(eg[i])
-                bx_data['eg'].append(obj_data)
-
-            bx_data['tau'] = []
-            for tau in taus:
-                obj_data = TDF.TAU.decode(tau[i])
-                obj_data['raw'] = TDF.TAU.hexstr(tau[i])
-                bx_data['tau'].append(obj_data)
-
-            bx_data['jet'] = []
-            for jet in jets:
-                obj_data = TDF.JET.decode(jet[i])
-                obj_data['raw'] = TDF.JET.hexstr(jet[i])
-                bx_data['jet'].append(obj_data)
-
-            obj_data = TDF.ETT.decode(ett[i])
-            obj_data['raw'] = TDF.ETT.hexstr(ett[i])
-            bx_data['ett'] = obj_data
-
-            obj_data = TDF.HT.decode(ht[i])
-            obj_data['raw'] = TDF.HT.hexstr(ht[i])
-            bx_data['ht'] = obj_data
-
-            obj_data = TDF.ETM.decode(etm[i])
-            obj_data['raw'] = TDF.ETM.hexstr(etm[i])
-            bx_data['etm'] = obj_data
-
-            obj_data = TDF.HTM.decode(htm[i])
-            obj_data['raw'] = TDF.HTM.hexstr(htm[i])
-            bx_data['htm'] = obj_data
-
-            obj_data = TDF.ETMHF.decode(etmhf[i])
-            obj_data['raw'] = TDF.ETMHF.hexstr(etmhf[i])
-            bx_data['etm'] = obj_data
-
-            obj_data = TDF.HTMHF.decode(htmhf[i])
-            obj_data['raw'] = TDF.HTMHF.hexstr(htmhf[i])
-            bx_data['htm'] = obj_data
-
-            obj_data = TDF.LINK_11_FR_0.decode(link_11_fr_0[i])
-            obj_data['raw'] = TDF.LINK_11_FR_0.hexstr(link_11_fr_0[i])
-            bx_data['link_11_fr_0'] = obj_data
-
-            obj_data = TDF.LINK_11_FR_1.decode(link_11_fr_1[i])
-            obj_data['raw'] = TDF.LINK_11_FR_1.hexstr(link_11_fr_1[i])
-            bx_data['link_11_fr_1'] = obj_data
-
-            obj_data = TDF.LINK_11_FR_2.decode(link_11_fr_2[i])
-            obj_data['raw'] = TDF.LINK_11_FR_2.hexstr(link_11_fr_2[i])
-            bx_data['link_11_fr_2'] = obj_data
-
-            obj_data = TDF.LINK_11_FR_3.decode(link_11_fr_3[i])
-            obj_data['raw'] = TDF.LINK_11_FR_3.hexstr(link_11_fr_3[i])
-            bx_data['link_11_fr_3'] = obj_data
-
-            obj_data = TDF.LINK_11_FR_4.decode(link_11_fr_4[i])
-            obj_data['raw'] = TDF.LINK_11_FR_4.hexstr(link_11_fr_4[i])
-            bx_data['link_11_fr_4'] = obj_data
+    def decode(self):
+        """Decode objects attributes to JSON, returns a JSON dictionary."""
+        data = list(self.iterdecode())
+        return json.dumps(data, sort_keys = True, indent = 2, separators = (',', ': '))
 
-            obj_data = TDF.LINK_11_FR_5.decode(link_11_fr_5[i])
-            obj_data['raw'] = TDF.LINK_11_FR_5.hexstr(link_11_fr_5[i])
-            bx_data['link_11_fr_5'] = obj_data
+    def decodeStream(self, fs, objects=None, skip_empty=False):
+        """Write decoded objects attributes as newline delimited JSON (one BX
+        record per line) to file stream *fs*, returns number of records
+        written. See iterdecode() for *objects* and *skip_empty*.
 
-            data.append(bx_data)
+        >>> with open('spy.ndjson', 'w') as fs:
+        ...     image.decodeStream(fs, objects=['muon', 'jet'], skip_empty=True)
+        """
+        count = 0
+        for bx_data in self.iterdecode(objects, skip_empty):
+            fs.write(json.dumps(bx_data, sort_keys = True, separators = (',', ':')))
+            fs.write("\n")
+            count += 1
+        return count
+
+class AlgorithmMismatch(namedtuple('AlgorithmMismatch', 'bx, mem, ref, diff')):
+    """Algorithm mismatch of a single BX, *mem* and *ref* are the compared
+    values, *diff* the list of mismatching algorithm indices."""
+
+class AlgorithmComparison(namedtuple('AlgorithmComparison', 'offset, size, mismatches, counts')):
+    """Result of an algorithm comparison, *mismatches* is a list of
+    AlgorithmMismatch, *counts* a dictionary of mismatch count by algorithm
+    index."""
 
-        return json.dumps(data, sort_keys = True, indent = 2, separators = (',', ': '))
+    def __str__(self):
+        lines = []
+        offset = self.offset
+        for mismatch in self.mismatches:
+            bx = mismatch.bx
+            bits_a_str = ",".join([str(n) for n in bitscan(mismatch.mem)]) or "none"
+            bits_b_str = ",".join([str(n) for n in bitscan(mismatch.ref)]) or "none"
+            bits_diff_str = ",".join([str(n) for n in mismatch.diff]) or "none"
+            value_a_hex = TDF.ALGORITHM.hexstr(mismatch.mem)
+            value_b_hex = TDF.ALGORITHM.hexstr(mismatch.ref)
+            lines.append(("Algorithm missmatch in BX {bx} with offset {offset}\n"
+                          "mem: 0x{value_a_hex} : {bits_a_str}\n"
+                          "ref: 0x{value_b_hex} : {bits_b_str}\n"
+                          "diff: {bits_diff_str}").format(**locals()))
+        if lines:
+            lines.append("Found {0} algorithm mismatches by comparing a range of {1} BX with offset {2}".format(len(self.mismatches), self.size, offset))
+        else:
+            lines.append("Success. No algorithm errors.")
+        return "\n".join(lines)
 
-class AlgorithmMemoryImage(ColumnMemoryImage):
+class AlgorithmMemoryImage(ColumnMemoryImage, AlgorithmCountsMixin):
     """Memory for spied algorithms."""
 
     def __init__(self):
         """Creates an empty memory image."""
         super(AlgorithmMemoryImage, self).__init__(MEMORY_BLOCKSIZE * 16, MEMORY_BLOCKSIZE)
 
+    @property
+    def _data(self):
+        return self.__data
+
+    @_data.setter
+    def _data(self, data):
+        self.__data = data
+        self._planes = None
+
+    def inject(self, values, column, count=1):
+        super(AlgorithmMemoryImage, self).inject(values, column, count)
+        self._planes = None
+
+    def setValue(self, col, row, value):
+        super(AlgorithmMemoryImage, self).setValue(col, row, value)
+        self._planes = None
+
+    def setAlgorithmPlanes(self, planes):
+        """Write algorithms from bit-plane view *planes* directly to the packed
+        memory columns, the view is kept for subsequent queries."""
+        assert planes.width == TDF.ALGORITHM.width, "invalid number of bit planes"
+        data = [0] * self.size
+        for column in range(self.columns):
+            words = planes.values(column * TDF.DATA_WIDTH, (column + 1) * TDF.DATA_WIDTH)[:self.blocksize]
+            offset = column * self.blocksize
+            data[offset:offset + len(words)] = words
+        self._data = data
+        self._planes = planes
+
+    def algorithmPlanes(self):
+        """Returns bit-plane view of algorithms (one bitset of BX per
+        algorithm). The view is built on first use and discarded on any
+        modification of the image.
+
+        >>> image.algorithmPlanes().count(42) # number of BX algorithm 42 fired
+        """
+        if self._planes is None:
+            self._planes = BitPlanes(self.algorithms(), TDF.ALGORITHM.width)
+        return self._planes
+
     def algorithms(self, offset = 0):
         """Return list of algorithms. Offset rotates values by BX. Provided for convenience."""
         values = self.merged()[:TDF.ORBIT_LENGTH]
         return values[offset:] + values[:offset]
 
+    def objectColumns(self):
+        """Returns list of tuples (key, specification, columns)."""
+        return [('algorithm', TDF.ALGORITHM, [self.algorithms()])]
+
+    def columnArrays(self):
+        """Returns list of (name, array) tuples, one array of trigger bits per
+        algorithm, eg. 'algorithm_42'. Arrays are taken from the bit-plane
+        view."""
+        planes = self.algorithmPlanes()
+        return [('algorithm_{0}'.format(n), planes.bits(n)) for n in range(TDF.ALGORITHM.width)]
+
     def dump(self, fs):
         """Dumps the serialized image to a file stream *fs*. Provided for convenience.
         >>> with open("memdump.txt", "w") as fs:
@@ -605,38 +698,29 @@ class AlgorithmMemoryImage(ColumnMemoryImage):
         self.inject(testvector.algorithms(), 0, TDF.ALGORITHM.dwords)
 
     def compare(self, image, offset = 0, size = TDF.ORBIT_LENGTH, outfile = sys.stdout):
+        """Compare algorithms with reference *image* using bitwise XOR of the
+        merged values, returns an AlgorithmComparison. The text report is
+        written to *outfile* unless it is None.
+        """
         assert isinstance(image, AlgorithmMemoryImage), "can only compare two memory images of same type"
-        errors = []
+        mask = TDF.ALGORITHM.bitmask
+        mismatches = []
+        counts = {}
         a = self.algorithms(offset)
         b = image.algorithms()
         for bx in range(size):
-            value_a = a[bx]
-            value_b = b[bx]
-            if value_a != value_b:
-                a_binstr = TDF.ALGORITHM.binstr(value_a)[::-1]
-                b_binstr = TDF.ALGORITHM.binstr(value_b)[::-1]
-                diff = []
-                for i in range(min(len(a_binstr), len(b_binstr))):
-                    if a_binstr[i] != b_binstr[i]:
-                        diff.append(dict(pos=i, a=a_binstr[i], b=b_binstr[i]))
-                bits_a = [n for n, bit in enumerate(a_binstr) if bit == '1']
-                bits_b = [n for n, bit in enumerate(b_binstr) if bit == '1']
-                bits_a_str = ",".join([str(n) for n in bits_a]) or "none"
-                bits_b_str = ",".join([str(n) for n in bits_b]) or "none"
-                bits_diff_str = ",".join([str(item['pos']) for item in diff]) or "none"
-                value_a_hex = TDF.ALGORITHM.hexstr(value_a)
-                value_b_hex = TDF.ALGORITHM.hexstr(value_b)
-                errors.append(("Algorithm missmatch in BX {bx} with offset {offset}\n"
-                               "mem: 0x{value_a_hex} : {bits_a_str}\n"
-                               "ref: 0x{value_b_hex} : {bits_b_str}\n"
-                               "diff: {bits_diff_str}").format(**locals()))
-        if errors:
-            errors.append("Found {0} algorithm mismatches by comparing a range of {1} BX with offset {2}".format(len(errors), size, offset))
-            outfile.write("\n".join(errors))
+            diff = (a[bx] ^ b[bx]) & mask
+            if diff:
+                positions = bitscan(diff)
+                for n in positions:
+                    counts[n] = counts.get(n, 0) + 1
+                mismatches.append(AlgorithmMismatch(bx, a[bx] & mask, b[bx] & mask, positions))
+        result = AlgorithmComparison(offset, size, mismatches, counts)
+        if outfile is not None:
+            outfile.write(str(result))
             outfile.write("\n")
-        else:
-            outfile.write("Success. No algorithm errors.\n")
-        outfile.flush()
+            outfile.flush()
+        return result
 
     def __str__(self):
         """Serialize image to memory dump format.
@@ -659,6 +743,14 @@ class FinorMemoryImage(ColumnMemoryImage):
         values = [value & 0x1 for value in self.merged()[:TDF.ORBIT_LENGTH]]
         return values[offset:] + values[:offset]
 
+    def objectColumns(self):
+        """Returns list of tuples (key, specification, columns)."""
+        return [('finor', TDF.FINOR, [self.finors()])]
+
+    def columnArrays(self):
+        """Returns list of (name, array) tuples of FINOR bits."""
+        return [('finor', array('B', self.finors()))]
+
     def read(self, fs):
         """Read from simple dump file."""
         reader = FileReader(fs, fields = (('finors', 'b1'), ))
@@ -726,6 +818,13 @@ class MasksMemoryImage(ColumnMemoryImage):
         values = [(value >> 1) & 0x1 for value in self.merged()[:FINOR_VETO_MASKS_BLOCKSIZE]]
         return values[offset:] + values[:offset]
 
+    def columnArrays(self):
+        """Returns list of (name, array) tuples of masks by algorithm."""
+        return [
+            ('finor_mask', array('B', self.finor_masks())),
+            ('veto_mask', array('B', self.veto_masks())),
+        ]
+
     def setDefault(self):
         values = [0x1] * FINOR_VETO_MASKS_BLOCKSIZE # veto=0, finor=1
         self.inject(values, 0, TDF.MASKS.dwords)
@@ -756,15 +855,20 @@ class MasksMemoryImage(ColumnMemoryImage):
                     except:
                         raise RuntimeError("error reading FINOR/veto mask file...")
             masks[name] = indices
-        # initialize default values
-        values = [0x1] * FINOR_VETO_MASKS_BLOCKSIZE # veto=0, finor=1
         try:
-            for index in masks['veto_masks']:
-                values[index] = values[index] | 0x2
-            for index in masks['finor_masks']:
-                values[index] = values[index] & ~0x1
+            self.setMasks(masks['finor_masks'], masks['veto_masks'])
         except KeyError, e:
             raise RuntimeError("missing key in masks file: {e}".format(**locals()))
+
+    def setMasks(self, finor_masks=(), veto_masks=()):
+        """Set FINOR and veto masks, *finor_masks* lists the algorithm indices
+        masked from FINOR, *veto_masks* the algorithms contributing to veto.
+        """
+        values = [0x1] * FINOR_VETO_MASKS_BLOCKSIZE # veto=0, finor=1
+        for index in veto_masks:
+            values[index] = values[index] | 0x2
+        for index in finor_masks:
+            values[index] = values[index] & ~0x1
         self.inject(values, 0, TDF.MASKS.dwords)
 
     def __str__(self):
@@ -791,12 +895,15 @@ class PreScaleFactorsImage(ColumnMemoryImage):
 	    algorithm = int(algorithm)
 	    factors = int(factors)
             factors_array[algorithm] = factors
+        self.setPreScaleFactors(factors_array)
+
+    def setPreScaleFactors(self, factors):
+        """Set prescale factors from dictionary *factors* by algorithm index,
+        algorithms not listed default to factor 1."""
         # initialize with inverted algorithm map
         values = [1] * PRESCALE_FACTORS_BLOCKSIZE
-        for algorithm, factors in factors_array.items():
-	    values[algorithm] = factors
-        #print "values:"
-        #print values
+        for algorithm, factor in factors.items():
+            values[algorithm] = factor
         self.inject(values, 0, TDF.MASKS.dwords)
 
 class AlgoBxMemoryImage(AlgorithmMemoryImage):
@@ -809,60 +916,135 @@ class AlgoBxMemoryImage(AlgorithmMemoryImage):
         """Enable or disable all algorithms of all BX."""
         self.clear(bitmask(TDF.DATA_WIDTH) if enabled else 0x0)
 
+    def isEnabled(self, algorithm, bx):
+        """Returns True if *algorithm* is enabled (not masked) in *bx*."""
+        return self.algorithmPlanes().test(algorithm, bx)
+
     def readBxMaskFile(self, fs):
         """Read algorithm mask from file.
 
-        Reads following file format:
+        Reads following file format (see tdf.mp7.bxmask for full syntax):
 
         <algo_index>: [<index>|<from>-<to>, ...]
         """
-        # TODO rewrite
-        masks = {}
-        for line in fs:
-            algorithm, bxs_ = line.strip().split(':')
-            algorithm = int(algorithm)
-            bxs_ = [bx.strip() for bx in bxs_.split(',')]
-            bxs = []
-            for bx in bxs_:
-                try:
-                    bxs.append(int(bx))
-                except ValueError:
-                    try:
-                        b, e = bx.strip().split('-')
-                        b, e = int(b), int(e)
-                        for i in range(b, e + 1):
-                            bxs.append(i)
-                    except:
-                        raise RuntimeError("error reading algorithm mask file...")
-            masks[algorithm] = bxs
-        # initialize with inverted algorithm map
-        values = [0] * TDF.ORBIT_LENGTH
-        for algorithm, bxs in masks.items():
-            for bx in bxs:
-                values[bx] = values[bx] | 1 << algorithm
-        # invert to get actual masking
-        values = [~value for value in values]
-        self.inject(values, 0, TDF.ALGORITHM.dwords)
-
-# TODO to be replaced by column based memory
+        from tdf.mp7.bxmask import BxMaskCompiler
+        self.setAlgorithmPlanes(BxMaskCompiler().compile(fs))
+
+class RopRecordInfo(namedtuple('RopRecordInfo', 'offset, length, event, bx')):
+    """Location and header information of a readout record, *offset* and
+    *length* in 64 bit lines."""
+
 class RopMemoryImage(GenericMemoryImage):
     """Memory for generic ROP records to be used with different modules.
 
         bbbbbbbbaaaaaaa
         ddddddddccccccc
+
+    The DWORD data is exposed as 64 bit word view and indexed by record
+    boundaries, both are built once on demand. Records start with an AMC
+    header line providing the record length in lines (including header and
+    trailer), the BX number and the event number.
+
+    >>> image.recordCount()
+    4
+    >>> image.record(2) # record data of third record
+    <RecordData object>
+    >>> image.recordsByBx(42)
+    [<RecordData object>]
+
+    Note: after modifying the data in place call *invalidate()*.
     """
 
     RECORD_WIDTH = 64
 
+    HEADER_LENGTH = (19, 0)
+    """Bit slice of record length (lines) in header line."""
+
+    HEADER_BX = (31, 20)
+    """Bit slice of BX number in header line."""
+
+    HEADER_EVENT = (55, 32)
+    """Bit slice of event number in header line."""
+
     def __init__(self):
         super(RopMemoryImage, self).__init__(65536)
 
+    @property
+    def _data(self):
+        return self.__data
+
+    @_data.setter
+    def _data(self, data):
+        self.__data = data
+        self.invalidate()
+
+    def invalidate(self):
+        """Discard cached word view and record index."""
+        self._words = None
+        self._index = None
+        self._index_bx = None
+        self._index_event = None
+
+    def words(self):
+        """Returns cached 64 bit word view of the image data."""
+        if self._words is None:
+            width = TDF.DATA_WIDTH
+            values = (low | (high << width) for low, high in zip(self.data[0::2], self.data[1::2]))
+            self._words = array(RECORD_TYPECODE, values) if RECORD_TYPECODE else list(values)
+        return self._words
+
     def lines(self):
         """Returns all 64 bit lines of record."""
-        data = []
-        for i in range(0, self.size, 2):
-            data.append(bitjoin(self.data[i:i + 2], TDF.DATA_WIDTH))
-        return data
+        return [int(value) for value in self.words()]
+
+    def index(self):
+        """Returns cached list of record boundaries (RopRecordInfo). Scanning
+        stops on an empty header or an incomplete record.
+        """
+        if self._index is None:
+            words = self.words()
+            index = []
+            offset = 0
+            while offset < len(words):
+                header = int(words[offset])
+                length = bitdecode(header, dict(length=self.HEADER_LENGTH))['length']
+                if not length or offset + length > len(words):
+                    break
+                fields = bitdecode(header, dict(bx=self.HEADER_BX, event=self.HEADER_EVENT))
+                index.append(RopRecordInfo(offset, length, fields['event'], fields['bx']))
+                offset += length
+            self._index = index
+            self._index_bx = {}
+            self._index_event = {}
+            for n, info in enumerate(index):
+                self._index_bx.setdefault(info.bx, []).append(n)
+                self._index_event.setdefault(info.event, []).append(n)
+        return self._index
+
+    def recordCount(self):
+        """Returns number of indexed records."""
+        return len(self.index())
+
+    def record(self, n=None):
+        """Returns record data container of record *n*, or of all 64 bit
+        lines if *n* is None, to be unpacked using record sections."""
+        words = self.words()
+        if n is None:
+            return RecordData(words)
+        info = self.index()[n]
+        return RecordData(words[info.offset:info.offset + info.length])
+
+    def recordsByBx(self, bx):
+        """Returns list of record data containers of records with BX number
+        *bx*."""
+        self.index()
+        return [self.record(n) for n in self._index_bx.get(bx, [])]
+
+    def recordsByEvent(self, event):
+        """Returns list of record data containers of records with event number
+        *event*."""
+        self.index()
+        return [self.record(n) for n in self._index_event.get(event, [])]
 
     def __str__(self):
         """Serialize image to memory dump format.
@@ -871,4 +1053,4 @@ class RopMemoryImage(GenericMemoryImage):
         ...     fs.write(data)
         """
         chars = charcount(self.RECORD_WIDTH)
-        return '\n'.join('{0:0{1}x}'.format(value, chars) for value in self.lines())
+        return '\n'.join('{0:0{1}x}'.format(value, chars) for value in self.words())
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2013-2017 Bernhard Arnold <bernahrd.arnold@cern.ch>
+#
+
+"""Prescale column sets.
+
+A prescale table provides prescale factors for all algorithms in several
+columns (eg. by luminosity). Every column is compiled once to the memory words
+of the prescale factor memory. Switching columns always reads back the current
+memory content of every device (the active column is not known across
+processes) and uploads only the differing words.
+
+Format
+------
+
+Whitespace or comma separated table, first row lists the column names,
+following rows the algorithm index and its factor for every column. Algorithms
+not listed default to factor 1.
+
+    algorithm    emergency  2.0e34  1.5e34
+    0            1          1       1
+    42           0          100     50
+
+Example
+-------
+
+    >>> sets = PreScaleSets.read(open('prescales.txt'))
+    >>> upload(devices, sets.images('2.0e34'))
+
+"""
+
+from tdf.mp7.images import PreScaleFactorsImage
+import re
+
+__all__ = [ 'PRESCALE_ITEM', 'PreScaleSets', '__doc__', ]
+
+PRESCALE_ITEM = 'gt_mp7_gtlfdl.prescale_factor'
+"""Prescale factor memory item."""
+
+SEPARATOR_REGEX = re.compile(r'[\s,]+')
+
+class PreScaleSets(object):
+    """Prescale table of several columns, *names* is the list of column names,
+    *factors* a dictionary of factors by algorithm index, every entry a list of
+    factors by column. Compiled columns are cached."""
+
+    def __init__(self, names, factors):
+        self.names = list(names)
+        self.factors = factors
+        for algorithm, values in factors.items():
+            if len(values) != len(self.names):
+                raise RuntimeError("algorithm {algorithm}: expected {0} factors, got {1}".format(len(self.names), len(values), **locals()))
+        self._words = {}
+
+    @classmethod
+    def read(cls, fs):
+        """Read prescale table from file stream *fs*."""
+        names = None
+        factors = {}
+        for lineno, line in enumerate(fs, 1):
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            tokens = SEPARATOR_REGEX.split(line)
+            if names is None:
+                names = tokens[1:]
+                continue
+            try:
+                factors[int(tokens[0])] = [int(token) for token in tokens[1:]]
+            except ValueError, e:
+                raise RuntimeError("error reading prescale table in line {lineno}: {e}".format(**locals()))
+        if not names:
+            raise RuntimeError("missing column names in prescale table")
+        return cls(names, factors)
+
+    def column(self, name):
+        """Returns dictionary of prescale factors by algorithm of column *name*."""
+        if name not in self.names:
+            raise KeyError("no such prescale column `{name}'".format(**locals()))
+        index = self.names.index(name)
+        return dict([(algorithm, values[index]) for algorithm, values in self.factors.items()])
+
+    def words(self, name):
+        """Returns list of memory words of prescale column *name*, compiled on
+        first request."""
+        if name not in self._words:
+            image = PreScaleFactorsImage()
+            image.setPreScaleFactors(self.column(name))
+            self._words[name] = image.serialize()
+        return self._words[name]
+
+    def images(self, name):
+        """Returns dictionary of item and memory words of column *name*, to be
+        passed to upload()."""
+        return {PRESCALE_ITEM: self.words(name)}
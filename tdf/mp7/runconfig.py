@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2013-2017 Bernhard Arnold <bernahrd.arnold@cern.ch>
+#
+
+"""Run configuration bundle.
+
+Bundles prescale factors, FINOR/veto masks and algorithm BX masks in a single
+YAML file. The bundle is parsed once and compiled to memory images ready to be
+uploaded (see TDFCore.upload), sections not present are not uploaded.
+
+Format
+------
+
+    prescales:              # <algorithm>: <factor>, default factor is 1
+      0: 1
+      42: 100
+    finor_masks: 8, 32, 64-76
+    veto_masks: [0, 2, 16-128]
+    bx_masks: |             # see tdf.mp7.bxmask for syntax
+      *: @abort_gap
+      42: 0-9
+
+Example
+-------
+
+    >>> config = RunConfig.read('run.yml')
+    >>> upload(['gt_mp7.1', 'gt_mp7.2'], config.images())
+
+"""
+
+from tdf.core.settings import yaml_loader
+from tdf.core.binutils import bitscan
+from tdf.mp7.bxmask import BxMaskCompiler
+from tdf.mp7.images import (
+    MasksMemoryImage,
+    PreScaleFactorsImage,
+    AlgoBxMemoryImage,
+)
+
+__all__ = [ 'ITEMS', 'RunConfig', '__doc__', ]
+
+ITEMS = {
+    'prescales': 'gt_mp7_gtlfdl.prescale_factor',
+    'masks': 'gt_mp7_gtlfdl.masks',
+    'bx_masks': 'gt_mp7_gtlfdl.algo_bx_mem',
+}
+"""Memory items by bundle section."""
+
+SECTIONS = ('prescales', 'finor_masks', 'veto_masks', 'bx_masks')
+
+class RunConfig(object):
+    """Run configuration bundle, *data* is the dictionary of bundle sections.
+    Memory images are compiled on first use."""
+
+    def __init__(self, data):
+        if not isinstance(data, dict):
+            raise RuntimeError("invalid run configuration, expected mapping of sections")
+        for key in data:
+            if key not in SECTIONS:
+                raise RuntimeError("invalid run configuration section `{key}'".format(**locals()))
+        self.data = data
+        self._images = None
+
+    @classmethod
+    def read(cls, filename):
+        """Read run configuration bundle from YAML file *filename*. Bundles
+        are parsed directly, they are not kept in the settings cache."""
+        from tdf.extern import yaml
+        with open(filename, 'rb') as fp:
+            return cls(yaml.load(fp, Loader=yaml_loader()) or {})
+
+    def algorithms(self, value):
+        """Returns list of algorithm indices from comma separated string or list
+        of indices and ranges *value*."""
+        if isinstance(value, (list, tuple)):
+            value = ','.join([str(token) for token in value])
+        return bitscan(BxMaskCompiler().parseAlgorithms(str(value or '')))
+
+    def images(self):
+        """Returns dictionary of memory images by item."""
+        if self._images is None:
+            images = {}
+            try:
+                if 'prescales' in self.data:
+                    image = PreScaleFactorsImage()
+                    image.setPreScaleFactors(dict([(int(algorithm), int(factor)) for algorithm, factor in (self.data['prescales'] or {}).items()]))
+                    images[ITEMS['prescales']] = image
+                if 'finor_masks' in self.data or 'veto_masks' in self.data:
+                    image = MasksMemoryImage()
+                    image.setMasks(self.algorithms(self.data.get('finor_masks')), self.algorithms(self.data.get('veto_masks')))
+                    images[ITEMS['masks']] = image
+            except (ValueError, IndexError), e:
+                raise RuntimeError("error reading run configuration: {e}".format(**locals()))
+            if 'bx_masks' in self.data:
+                image = AlgoBxMemoryImage()
+                image.setAlgorithmPlanes(BxMaskCompiler().compile((self.data['bx_masks'] or '').splitlines()))
+                images[ITEMS['bx_masks']] = image
+            self._images = images
+        return self._images